@@ -1,41 +1,98 @@
-from flask import Flask, render_template, request, url_for, make_response, session, jsonify, send_file, Response, stream_with_context
+from flask import Flask, render_template, request, url_for, make_response, session, jsonify, redirect, send_from_directory, abort, Response, stream_with_context
 import os
+import json
+import logging
 from dotenv import load_dotenv
 import re
 import uuid
+import time
+import threading
+import click
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+from urllib.parse import quote
 from pathlib import Path  
-from werkzeug.utils import secure_filename
+from werkzeug.utils import safe_join, secure_filename
+
+# The utils modules read part of their settings at import, so the .env file must be loaded first
+load_dotenv()
 
 # Import utility functions and constants utils.py in folder utils
+from utils.jobs import JobManager, QueueFull
+from utils.workspace import WorkspaceStore
+from utils.metrics import metrics
+from utils.voice_samples import VoiceSampleCache
+from utils.sessions import init_server_sessions
+from utils.retention import RetentionPolicy
+from utils.clients import get_tts_backend
+from utils.audio import OUTPUT_FORMATS, mimetype_for_file, resolve_output_format
 
 from utils.utils import (
-    extract_text_from_pdf_pypdf2,
-    extract_text_from_website,
-    extract_text_from_pdf,
+    extract_text_from_websites,
+    iter_extracted_sources,
+    combine_source_texts,
+    MAX_BATCH_SOURCES,
+    extract_pdf_text,
+    get_cached_pdf_text,
+    hash_file_stream,
     generate_conversation,
+    condense_text,
     synthesize_speech,
+    synthesize_speech_stream,
+    open_podcast_script,
+    write_podcast_script,
+    podcast_script_paths,
+    podcast_script_stream,
     synthesize_text_stream,
+    encode_audio,
+    AUDIO_OUTPUT_FORMAT,
     cleanup_temp_file,
-    save_text_to_file,
-    load_text_from_file,
     cleanup_old_files,
-    EXTRACTED_TEXT_FILE,
-    CONVERSATION_FILE,
+    get_retention,
+    MAX_OUTLINE_TEXT_LENGTH,
     transcribe_audio,
-    generate_answer
+    generate_answer,
+    answer_question_stream
 )
 
 
-load_dotenv()
-cleanup_old_files()
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-keyx123'  
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['VOICE_SAMPLE_DIR'] = "static/voice_samples"
-app.config['EXTRACTED_TEXT_FILE'] = 'extracted_text.txt'  
+app.config['AUDIO_DIR'] = 'static'
+# Rendered podcasts and voice samples never change under the same name, so browsers may keep them for a day
+app.config['AUDIO_MAX_AGE'] = int(os.getenv('AUDIO_MAX_AGE', 86400))
+app.config['WORKSPACE_DB'] = os.getenv('WORKSPACE_DB', 'text_files/workspaces.db')
+app.config['JOB_DB'] = os.getenv('JOB_DB', 'text_files/jobs.db')
+# Sessions live on the server and the cookie only carries the session id. Documents and conversations are
+# kept in the workspace store, so a session holds no more than ids, voices and the latest audio file name.
+app.config['SESSION_TYPE'] = os.getenv('SESSION_TYPE', 'filesystem')
+app.config['SESSION_FILE_DIR'] = os.getenv('SESSION_FILE_DIR', 'cache/sessions')
+app.config['SESSION_FILE_THRESHOLD'] = int(os.getenv('SESSION_FILE_THRESHOLD', 10000))
+app.config['SESSION_PERMANENT'] = False
+init_server_sessions(app)
+
+# Background jobs for long-running outline, audio and PDF extraction work. Their state is shared through
+# JOB_DB, so a job can be polled from any worker process.
+job_manager = JobManager(workers=int(os.getenv('JOB_WORKERS', 2)),
+                         max_queued=int(os.getenv('JOB_QUEUE_SIZE', 20)),
+                         db_path=app.config['JOB_DB'])
+# Script generation for streamed podcasts has its own workers, so a listener never waits behind queued renders
+stream_manager = JobManager(workers=int(os.getenv('STREAM_WORKERS', 4)),
+                            max_queued=int(os.getenv('STREAM_QUEUE_SIZE', 4)),
+                            db_path=app.config['JOB_DB'])
+
+# Per-session texts (extracted text and conversation), so concurrent users never share files
+workspace_store = WorkspaceStore(app.config['WORKSPACE_DB'])
+
+def get_workspace_id():
+    """Returns the workspace id of the current session, creating one on first use."""
+    if 'workspace_id' not in session:
+        session['workspace_id'] = uuid.uuid4().hex
+    return session['workspace_id']
 
 # Define available voices (Option 1: Hardcoded)
 AVAILABLE_VOICES = [
@@ -47,11 +104,75 @@ AVAILABLE_VOICES = [
     # Add more voices as needed
 ]
 
+def synthesize_voice_sample(voice_name, sample_text):
+    return encode_audio(list(synthesize_text_stream(sample_text, '', voice_name)), 'wav')
+
+# Voice samples played from the voice pickers, rendered once per voice and kept on disk
+voice_samples = VoiceSampleCache(app.config['VOICE_SAMPLE_DIR'], "Hi there, I'd love to be your podcast host!",
+                                 synthesize_voice_sample)
+
+def warm_voice_samples(concurrency=4):
+    """Renders the samples of all AVAILABLE_VOICES that are not on disk yet. Returns the voices that failed."""
+    results = voice_samples.warm([voice['name'] for voice in AVAILABLE_VOICES], concurrency)
+    return [voice_name for voice_name, path in results.items() if not path]
+
+@app.cli.command('warm-voice-samples')
+@click.option('--concurrency', default=4, show_default=True, help='Number of samples synthesized in parallel.')
+def warm_voice_samples_command(concurrency):
+    """Pre-generates the voice samples for every available voice."""
+    failed = warm_voice_samples(concurrency)
+    if failed:
+        raise click.ClickException(f"Failed to generate voice samples for: {', '.join(failed)}")
+    click.echo(f"Voice samples are ready for {len(AVAILABLE_VOICES)} voices.")
+
+@app.cli.command('cleanup-old-files')
+@click.option('--max-age-hours', type=float, default=None,
+              help='Remove files unused for longer than this, overriding the age limit of every class.')
+def cleanup_old_files_command(max_age_hours):
+    """Applies the retention policies to uploads, conversations, podcasts and temporary audio now."""
+    report = cleanup_old_files(timedelta(hours=max_age_hours) if max_age_hours is not None else None)
+    for name, result in report.items():
+        click.echo(f"{name}: removed {result['removed_files']} files ({result['reclaimed_bytes']} bytes), "
+                   f"kept {result['remaining_files']} files ({result['remaining_bytes']} bytes)")
+
+# Worker processes spawned for PDF extraction re-import this module as __mp_main__ when the app is started
+# with `python app.py`; only the server process starts background work
+SERVER_PROCESS = __name__ != '__mp_main__'
+
+# Optionally render missing samples in the background when the app starts
+if SERVER_PROCESS and os.getenv('WARM_VOICE_SAMPLES', '').lower() in ('1', 'true', 'yes'):
+    threading.Thread(target=warm_voice_samples, name='voice-sample-warmup', daemon=True).start()
+
+# Create the Azure speech backend in the background, so its pooled connections are already open when the
+# first request synthesizes speech (set AZURE_TTS_PREWARM=0 to create it on first use instead)
+if (SERVER_PROCESS and os.getenv('TTS_BACKEND', 'azure').lower() == 'azure' and os.getenv('SPEECH_KEY_NEW')
+        and int(os.getenv('AZURE_TTS_PREWARM', 1)) > 0):
+    threading.Thread(target=get_tts_backend, name='tts-backend-warmup', daemon=True).start()
+
+# Sessions and the workspace texts they point to expire together, once unchanged for the session lifetime
+# (the same timeout Flask-Session gives stored sessions)
+SESSION_MAX_AGE = app.permanent_session_lifetime.total_seconds()
+retention = get_retention()
+if app.config['SESSION_TYPE'] == 'filesystem':
+    # Session files are named by the hex digest of their id (MD5 or SHA-256, depending on the cachelib version).
+    # The store's item counter is named the same way but rewritten with every session, so it is only
+    # removed once the whole store is idle, and cachelib recreates it.
+    retention.policies.append(RetentionPolicy('sessions', app.config['SESSION_FILE_DIR'], '[0-9a-f]' * 32 + '*',
+                                              max_age=SESSION_MAX_AGE))
+retention.register_sweeper('workspaces',
+                           lambda max_age: workspace_store.expire(SESSION_MAX_AGE if max_age is None else max_age))
+
+# Apply the retention policies periodically in the background (0 disables; use the cleanup-old-files command instead)
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', 900))
+if SERVER_PROCESS and RETENTION_INTERVAL > 0:
+    retention.start(RETENTION_INTERVAL)
+
 @app.route('/', methods=['GET'])
 def index():
     error = None
-    conversation = session.get('conversation', '') or load_text_from_file(CONVERSATION_FILE)
-    text_content = session.get('extracted_text', '') or load_text_from_file(EXTRACTED_TEXT_FILE)
+    workspace_id = get_workspace_id()
+    conversation = workspace_store.load(workspace_id, 'conversation')
+    text_content = workspace_store.load(workspace_id, 'extracted_text')
     audio_file = session.get('audio_file', '')
     if audio_file and os.path.exists(os.path.join('static', audio_file)):
         audio_exists = True
@@ -64,6 +185,7 @@ def index():
                            conversation=conversation,
                            text_content=text_content,
                            audio_file=audio_file,
+                           audio_mimetype=mimetype_for_file(audio_file) if audio_file else None,
                            available_voices=AVAILABLE_VOICES,
                            selected_voice1=session.get('speaker1_voice', AVAILABLE_VOICES[0]['name']),
                            selected_voice2=session.get('speaker2_voice', AVAILABLE_VOICES[1]['name']), 
@@ -91,35 +213,33 @@ def upload_and_convert_pdf():
             return jsonify({'status': 'error', 'message': error}), 400
 
         if pdf_file and allowed_file(pdf_file.filename):
-            # Generate a unique filename
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            unique_id = uuid.uuid4().hex
-            filename = f"{timestamp}_{unique_id}_{secure_filename(pdf_file.filename)}"
-            pdf_path = Path(app.config['UPLOAD_FOLDER']) / filename
-
-            # Save the PDF file
-            pdf_file.save(pdf_path)
-            session['pdf_path'] = str(pdf_path)
-            print(f"PDF uploaded and saved to {pdf_path}")
-
             # Retrieve the 'use_azure_doc_intelligence' flag
             use_azure = request.form.get('use_azure_doc_intelligence') == 'true'
 
-            # Convert PDF to text based on the selected method
-            if use_azure:
-                text_content = extract_text_from_pdf(pdf_path)
-                method_used = 'Azure Document Intelligence'
+            # Repeat uploads of the same file are answered from the extraction cache
+            content_hash = hash_file_stream(pdf_file.stream)
+            text_content = get_cached_pdf_text(content_hash, use_azure)
+            if text_content:
+                method_used = 'cached text'
+                print(f"Using cached text for PDF {content_hash}")
             else:
-                text_content = extract_text_from_pdf_pypdf2(pdf_path)
-                method_used = 'Alternative Method'
+                # Generate a unique filename
+                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+                unique_id = uuid.uuid4().hex
+                filename = f"{timestamp}_{unique_id}_{secure_filename(pdf_file.filename)}"
+                pdf_path = Path(app.config['UPLOAD_FOLDER']) / filename
 
-            if text_content:
-                # Save the extracted text to a file (optional)
-                text_file_path = Path(app.config['EXTRACTED_TEXT_FILE'])
-                save_text_to_file(text_content, text_file_path)
+                # Save the PDF file
+                pdf_file.save(pdf_path)
+                session['pdf_path'] = str(pdf_path)
+                print(f"PDF uploaded and saved to {pdf_path}")
+
+                # Convert PDF to text based on the selected method
+                text_content, method_used = extract_pdf_text(pdf_path, use_azure, content_hash)
 
-                # Store the extracted text in the session
-                session['extracted_text'] = text_content
+            if text_content:
+                # Save the extracted text to the session's workspace
+                workspace_store.save(get_workspace_id(), 'extracted_text', text_content)
                 message = f'PDF uploaded and converted to text successfully using {method_used}.'
                 print(message)
 
@@ -146,32 +266,32 @@ def upload_and_convert_pdf():
 def generate_outline():
     try:
         text_content = request.form.get('text_content', '').strip()
-        print(f"Text content retrieved: {text_content}")
+        app.logger.debug(f"Text content retrieved: {len(text_content)} characters")
 
         if not text_content:
             error = 'Text content is empty. Please upload and convert a PDF or enter text.'
             print("Text content is empty when attempting to generate outline.")
             return jsonify({'status': 'error', 'message': error})
         else:
-            MAX_TEXT_LENGTH = 15000
-            if len(text_content) > MAX_TEXT_LENGTH:
-                text_content = text_content[:MAX_TEXT_LENGTH]
-                error = f'Text content truncated to {MAX_TEXT_LENGTH} characters.'
-                print(f"Text content truncated to {MAX_TEXT_LENGTH} characters.")
+            if len(text_content) > MAX_OUTLINE_TEXT_LENGTH:
+                print(f"Text content exceeds {MAX_OUTLINE_TEXT_LENGTH} characters. Summarizing before generating the outline...")
+            text_content, timings = condense_text(text_content)
+            print(f"Text condensing timings: {timings}")
 
             process_id = str(uuid.uuid4())
             print("Calling OpenAI API to generate a new conversation...")
+            conversation_start = time.perf_counter()
             conversation = generate_conversation(text_content, process_id)
+            timings['conversation_seconds'] = round(time.perf_counter() - conversation_start, 3)
 
             if not conversation:
                 error = 'Failed to generate conversation.'
                 print("Failed to generate conversation.")
                 return jsonify({'status': 'error', 'message': error})
             else:
-                session['conversation'] = conversation
-                save_text_to_file(conversation, CONVERSATION_FILE)
-                print("New conversation stored in session and saved to file.")
-                return jsonify({'status': 'success', 'conversation': conversation, 'message': 'Conversation generated successfully.'})
+                workspace_store.save(get_workspace_id(), 'conversation', conversation)
+                print("New conversation saved to the workspace.")
+                return jsonify({'status': 'success', 'conversation': conversation, 'message': 'Conversation generated successfully.', 'timings': timings})
     except Exception as e:
         error = f"Error during conversation generation: {e}"
         print(error)
@@ -195,7 +315,9 @@ def generate_audio():
             session['process_id'] = process_id
 
             # Synthesize speech using the utility function
-            audio_file = synthesize_speech(conversation, process_id, selected_voice1, selected_voice2)
+            output_format = request.form.get('format', AUDIO_OUTPUT_FORMAT)
+            audio_file = synthesize_speech(conversation, process_id, selected_voice1, selected_voice2,
+                                           output_format=output_format)
             if not audio_file:
                 error = 'Failed to synthesize speech.'
                 return jsonify({'status': 'error', 'message': error})
@@ -208,6 +330,190 @@ def generate_audio():
         print(error)
         return jsonify({'status': 'error', 'message': error})
     
+@app.route('/stream_audio', methods=['GET'])
+def stream_audio():
+    """Streams the podcast for the current conversation while it is being synthesized."""
+    selected_voice1 = request.args.get('speaker1_voice', session.get('speaker1_voice', AVAILABLE_VOICES[0]['name']))
+    selected_voice2 = request.args.get('speaker2_voice', session.get('speaker2_voice', AVAILABLE_VOICES[1]['name']))
+    conversation = workspace_store.load(get_workspace_id(), 'conversation')
+
+    if not conversation.strip():
+        error = 'Conversation text is empty. Please generate the outline first.'
+        print("Conversation text is empty when attempting to stream audio.")
+        return jsonify({'status': 'error', 'message': error}), 400
+
+    print("Streaming audio from conversation text...")
+    output_format = resolve_output_format(request.args.get('format', AUDIO_OUTPUT_FORMAT))
+    audio_stream = synthesize_speech_stream(conversation, selected_voice1, selected_voice2, output_format=output_format)
+    return Response(stream_with_context(audio_stream), mimetype=OUTPUT_FORMATS[output_format]['mimetype'],
+                    headers={'Cache-Control': 'no-store'})
+
+@app.route('/stream_podcast', methods=['POST'])
+def start_podcast_stream():
+    """
+    Starts generating a podcast script from the extracted text and returns the URL of its audio stream.
+    The script is generated once, on a stream worker, and saved as the workspace's conversation when finished;
+    the stream URL can be replayed without generating it again. Answers 429 when all stream workers are busy.
+    """
+    selected_voice1 = request.form.get('speaker1_voice', session.get('speaker1_voice', AVAILABLE_VOICES[0]['name']))
+    selected_voice2 = request.form.get('speaker2_voice', session.get('speaker2_voice', AVAILABLE_VOICES[1]['name']))
+    workspace_id = get_workspace_id()
+    text_content = workspace_store.load(workspace_id, 'extracted_text')
+
+    if not text_content.strip():
+        error = 'Text content is empty. Please upload and convert a PDF or enter text.'
+        print("Text content is empty when attempting to stream a podcast.")
+        return jsonify({'status': 'error', 'message': error}), 400
+
+    stream_id = uuid.uuid4().hex
+    open_podcast_script(stream_id)
+    try:
+        job = stream_manager.submit('podcast_script', run_podcast_script_job, workspace_id, text_content, stream_id)
+    except QueueFull as e:
+        print(f"Rejected podcast stream: {e}")
+        podcast_script_paths(stream_id)[1].unlink(missing_ok=True)
+        return busy_response()
+    print(f"Started podcast stream {stream_id} (job {job.id})")
+    stream_url = url_for('stream_podcast', stream_id=stream_id, speaker1_voice=selected_voice1,
+                         speaker2_voice=selected_voice2,
+                         format=resolve_output_format(request.form.get('format', AUDIO_OUTPUT_FORMAT)))
+    return jsonify({'status': 'success', 'stream_id': stream_id, 'stream_url': stream_url, 'job_id': job.id,
+                    'status_url': url_for('job_status', job_id=job.id)})
+
+@app.route('/stream_podcast/<stream_id>', methods=['GET'])
+def stream_podcast(stream_id):
+    """Streams the audio of a podcast started with POST /stream_podcast, while its script is still being generated."""
+    if not re.fullmatch(r'[0-9a-f]{32}', stream_id) or not any(path.exists() for path in podcast_script_paths(stream_id)):
+        abort(404)
+
+    selected_voice1 = request.args.get('speaker1_voice', AVAILABLE_VOICES[0]['name'])
+    selected_voice2 = request.args.get('speaker2_voice', AVAILABLE_VOICES[1]['name'])
+    output_format = resolve_output_format(request.args.get('format', AUDIO_OUTPUT_FORMAT))
+    audio_stream = podcast_script_stream(stream_id, selected_voice1, selected_voice2, output_format=output_format)
+    return Response(stream_with_context(audio_stream), mimetype=OUTPUT_FORMATS[output_format]['mimetype'],
+                    headers={'Cache-Control': 'no-store'})
+
+def run_outline_job(job, workspace_id, text_content):
+    job.update(stage='summarizing')
+    text_content, timings = condense_text(text_content)
+    job.update(stage='generating_conversation')
+    conversation = generate_conversation(text_content, job.id)
+    if not conversation:
+        raise RuntimeError('Failed to generate conversation.')
+    workspace_store.save(workspace_id, 'conversation', conversation)
+    return {'conversation': conversation, 'timings': timings}
+
+def run_audio_job(job, conversation, speaker1_voice, speaker2_voice, output_format):
+    job.update(stage='synthesizing')
+    audio_file = synthesize_speech(conversation, job.id, speaker1_voice, speaker2_voice,
+                                   progress_callback=lambda done, total: job.update(done=done, total=total),
+                                   output_format=output_format)
+    if not audio_file:
+        raise RuntimeError('Failed to synthesize speech.')
+    return {'audio_file': audio_file}
+
+def run_pdf_job(job, workspace_id, pdf_path, use_azure, content_hash):
+    job.update(stage='extracting')
+    text_content, method_used = extract_pdf_text(pdf_path, use_azure, content_hash)
+    if not text_content:
+        raise RuntimeError(f'Failed to extract text from PDF using {method_used}.')
+    workspace_store.save(workspace_id, 'extracted_text', text_content)
+    return {'text_content': text_content, 'method': method_used}
+
+def run_podcast_script_job(job, workspace_id, text_content, stream_id):
+    job.update(stage='generating_conversation')
+    script = write_podcast_script(text_content, stream_id)
+    if script is None:
+        raise RuntimeError('Failed to generate the podcast script.')
+    workspace_store.save(workspace_id, 'conversation', script)
+    return {'stream_id': stream_id}
+
+def run_cached_pdf_job(job, workspace_id, text_content):
+    workspace_store.save(workspace_id, 'extracted_text', text_content)
+    return {'text_content': text_content, 'method': 'cached text'}
+
+def busy_response():
+    """The 429 response for work rejected because its queue is full."""
+    response = jsonify({'status': 'error', 'message': 'The server is busy. Please try again shortly.'})
+    response.headers['Retry-After'] = '10'
+    return response, 429
+
+def submit_job(kind, func, *args):
+    """Queues a job and returns the 202 response, or a 429 response if the queue is full."""
+    try:
+        job = job_manager.submit(kind, func, *args)
+    except QueueFull as e:
+        print(f"Rejected {kind} job: {e}")
+        return busy_response()
+    print(f"Queued {kind} job {job.id}")
+    return jsonify({'status': 'success', 'job_id': job.id, 'status_url': url_for('job_status', job_id=job.id)}), 202
+
+@app.route('/jobs/outline', methods=['POST'])
+def submit_outline_job():
+    text_content = request.form.get('text_content', '').strip()
+    if not text_content:
+        return jsonify({'status': 'error', 'message': 'Text content is empty. Please upload and convert a PDF or enter text.'}), 400
+    return submit_job('outline', run_outline_job, get_workspace_id(), text_content)
+
+@app.route('/jobs/audio', methods=['POST'])
+def submit_audio_job():
+    selected_voice1 = request.form.get('speaker1_voice', AVAILABLE_VOICES[0]['name'])
+    selected_voice2 = request.form.get('speaker2_voice', AVAILABLE_VOICES[1]['name'])
+    conversation = request.form.get('conversation_text', '')
+    if not conversation.strip():
+        return jsonify({'status': 'error', 'message': 'Conversation text is empty. Please generate the outline first.'}), 400
+    output_format = request.form.get('format', AUDIO_OUTPUT_FORMAT)
+    return submit_job('audio', run_audio_job, conversation, selected_voice1, selected_voice2, output_format)
+
+@app.route('/jobs/pdf', methods=['POST'])
+def submit_pdf_job():
+    pdf_file = request.files.get('pdf_file')
+    if not pdf_file or pdf_file.filename == '':
+        return jsonify({'status': 'error', 'message': 'No PDF file selected for upload.'}), 400
+    if not allowed_file(pdf_file.filename):
+        return jsonify({'status': 'error', 'message': 'Invalid file type. Only PDF files are allowed.'}), 400
+
+    use_azure = request.form.get('use_azure_doc_intelligence') == 'true'
+    content_hash = hash_file_stream(pdf_file.stream)
+    cached_text = get_cached_pdf_text(content_hash, use_azure)
+    if cached_text:
+        return submit_job('pdf', run_cached_pdf_job, get_workspace_id(), cached_text)
+
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    filename = f"{timestamp}_{uuid.uuid4().hex}_{secure_filename(pdf_file.filename)}"
+    pdf_path = Path(app.config['UPLOAD_FOLDER']) / filename
+    pdf_file.save(pdf_path)
+
+    return submit_job('pdf', run_pdf_job, get_workspace_id(), pdf_path, use_azure, content_hash)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id) or stream_manager.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Unknown job id.'}), 404
+
+    job_info = job.to_dict()
+    # Texts are saved to the workspace by the jobs themselves; only the audio file name lives in the session
+    if job_info['status'] == 'completed' and 'audio_file' in job_info['result']:
+        session['audio_file'] = job_info['result']['audio_file']
+    return jsonify({'status': 'success', 'job': job_info})
+
+@app.route('/audio/<path:filename>', methods=['GET'])
+def serve_audio(filename):
+    """Serves generated podcasts and voice samples with range and conditional request support."""
+    if mimetype_for_file(filename) == 'application/octet-stream':
+        abort(404)
+    # Audio is written relative to the working directory, like the rest of the generated files
+    audio_dir = os.path.abspath(app.config['AUDIO_DIR'])
+    file_path = safe_join(audio_dir, filename)
+    if file_path:
+        # Downloads count as use, so size-based retention evicts podcasts nobody plays first
+        retention.touch(file_path)
+    response = send_from_directory(audio_dir, filename, mimetype=mimetype_for_file(filename),
+                                   conditional=True, max_age=app.config['AUDIO_MAX_AGE'])
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
 @app.route('/get_voice_sample', methods=['POST'])
 def get_voice_sample():
     try:
@@ -218,41 +524,14 @@ def get_voice_sample():
         if not voice_name:
             return jsonify({'status': 'error', 'message': 'Voice name not provided'}), 400
         
-        # Ensure the directory for storing voice samples exists
-        os.makedirs(app.config['VOICE_SAMPLE_DIR'], exist_ok=True)
- 
-        # Define the path for the voice sample
-        sanitized_voice_name = secure_filename(voice_name)  # Use a secure filename
-        sample_file_path = os.path.join(app.config['VOICE_SAMPLE_DIR'], f"{sanitized_voice_name}_sample.wav")
-
-        # Check if the sample file already exists
-        if os.path.exists(sample_file_path):
-            print(f"Using cached voice sample for: {voice_name}")
-            # If the sample exists, return it directly
-            with open(sample_file_path, 'rb') as audio_file:
-                return Response(audio_file.read(), mimetype='audio/wav')
-
-        # If the sample doesn't exist, synthesize it
-        sample_text = "Hi there, I'd love to be your podcast host!"
-        audio_chunks = []
-
-        # Generate the voice sample using synthesize_text_stream
-        for audio_data in synthesize_text_stream(sample_text, '', voice_name):
-            if audio_data:
-                audio_chunks.append(audio_data)
-
-        if not audio_chunks:
+        # Synthesize the sample unless it is already on disk; concurrent requests for the same voice share one synthesis
+        sample_file_path = voice_samples.get(voice_name)
+        if not sample_file_path:
             return jsonify({'status': 'error', 'message': 'Failed to generate voice sample'}), 500
 
-        # Combine the audio chunks into one bytes object
-        combined_audio_data = b''.join(audio_chunks)
-
-        # Save the synthesized audio to a file for future use
-        with open(sample_file_path, 'wb') as audio_file:
-            audio_file.write(combined_audio_data)
-
-        # Return the combined audio data as a response
-        return Response(combined_audio_data, mimetype='audio/wav')
+        # Redirect to the GET URL of the file: range and conditional requests only apply to GET and HEAD
+        filename = Path(sample_file_path).relative_to(app.config['AUDIO_DIR']).as_posix()
+        return redirect(url_for('serve_audio', filename=filename), code=303)
 
     except Exception as e:
         error = f"Error generating voice sample: {e}"
@@ -262,21 +541,26 @@ def get_voice_sample():
 @app.route('/extract_website', methods=['POST'])
 def extract_website():
     try:
-        website_url = request.form.get('website_url', '').strip()
-        if not website_url:
+        # One or more URLs, as repeated fields or separated by whitespace
+        website_urls = [url for value in request.form.getlist('website_url') for url in value.split()]
+        if not website_urls:
             error = 'No website URL provided.'
             return jsonify({'status': 'error', 'message': error})
         else:
-            if not re.match(r'^https?:\/\/\S+\.\S+', website_url):
+            invalid_urls = [url for url in website_urls if not re.match(r'^https?:\/\/\S+\.\S+', url)]
+            if invalid_urls:
                 error = 'Invalid URL format. Please enter a valid website URL.'
                 return jsonify({'status': 'error', 'message': error})
             else:
-                extracted_text = extract_text_from_website(website_url)
+                # Several websites are fetched concurrently and combined into one source document
+                extracted_text, failed_urls = extract_text_from_websites(website_urls)
                 if extracted_text:
-                    save_text_to_file(extracted_text, EXTRACTED_TEXT_FILE)
-                    session['extracted_text'] = extracted_text
+                    workspace_store.save(get_workspace_id(), 'extracted_text', extracted_text)
                     message = 'Text extracted from website successfully.'
-                    return jsonify({'status': 'success', 'text_content': extracted_text, 'message': message})
+                    if failed_urls:
+                        message = f"Text extracted from {len(website_urls) - len(failed_urls)} of {len(website_urls)} websites."
+                    return jsonify({'status': 'success', 'text_content': extracted_text, 'message': message,
+                                    'failed_urls': failed_urls})
                 else:
                     error = 'Failed to extract text from the provided website.'
                     return jsonify({'status': 'error', 'message': error})
@@ -286,6 +570,75 @@ def extract_website():
         return jsonify({'status': 'error', 'message': error})
 
 
+@app.route('/ingest_batch', methods=['POST'])
+def ingest_batch():
+    """
+    Extracts several PDFs and websites concurrently and combines them into one text, with repeated paragraphs removed.
+    Streams newline-delimited JSON: a 'source' event as each source finishes, then a 'result' event with the combined text.
+    """
+    try:
+        pdf_files = [pdf_file for pdf_file in request.files.getlist('pdf_files') if pdf_file.filename]
+        website_urls = [url for value in request.form.getlist('website_urls') for url in value.split()]
+        use_azure = request.form.get('use_azure_doc_intelligence') == 'true'
+
+        if not pdf_files and not website_urls:
+            return jsonify({'status': 'error', 'message': 'No PDF files or website URLs provided.'}), 400
+        if len(pdf_files) + len(website_urls) > MAX_BATCH_SOURCES:
+            return jsonify({'status': 'error', 'message': f'At most {MAX_BATCH_SOURCES} sources can be ingested at once.'}), 400
+        if not all(allowed_file(pdf_file.filename) for pdf_file in pdf_files):
+            return jsonify({'status': 'error', 'message': 'Invalid file type. Only PDF files are allowed.'}), 400
+        if not all(re.match(r'^https?:\/\/\S+\.\S+', url) for url in website_urls):
+            return jsonify({'status': 'error', 'message': 'Invalid URL format. Please enter valid website URLs.'}), 400
+
+        sources = []
+        for pdf_file in pdf_files:
+            content_hash = hash_file_stream(pdf_file.stream)
+            pdf_path = None
+            if not get_cached_pdf_text(content_hash, use_azure):
+                filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex}_{secure_filename(pdf_file.filename)}"
+                pdf_path = Path(app.config['UPLOAD_FOLDER']) / filename
+                pdf_file.save(pdf_path)
+            sources.append({'type': 'pdf', 'name': pdf_file.filename, 'path': pdf_path,
+                            'use_azure': use_azure, 'content_hash': content_hash})
+        for url in website_urls:
+            sources.append({'type': 'url', 'name': url, 'url': url})
+    except Exception as e:
+        error = f"Error preparing batch ingestion: {e}"
+        print(error)
+        return jsonify({'status': 'error', 'message': error}), 500
+
+    workspace_id = get_workspace_id()
+    print(f"Ingesting {len(sources)} sources...")
+
+    def generate():
+        texts = [None] * len(sources)
+        for done, (i, text, method_used) in enumerate(iter_extracted_sources(sources), start=1):
+            texts[i] = text
+            yield json.dumps({'event': 'source', 'index': i, 'name': sources[i]['name'], 'type': sources[i]['type'],
+                              'status': 'success' if text else 'error', 'method': method_used,
+                              'characters': len(text or ''), 'done': done, 'total': len(sources)}) + '\n'
+
+        failed_sources = [source['name'] for source, text in zip(sources, texts) if not text]
+        combined_text, duplicates_removed = combine_source_texts([text for text in texts if text])
+        if not combined_text:
+            yield json.dumps({'event': 'result', 'status': 'error', 'message': 'Failed to extract text from the provided sources.',
+                              'failed_sources': failed_sources}) + '\n'
+            return
+
+        workspace_store.save(workspace_id, 'extracted_text', combined_text)
+        message = f'Text extracted from {len(sources) - len(failed_sources)} of {len(sources)} sources.'
+        print(f"{message} Removed {duplicates_removed} repeated sentences.")
+        yield json.dumps({'event': 'result', 'status': 'success', 'message': message, 'text_content': combined_text,
+                          'duplicates_removed': duplicates_removed, 'failed_sources': failed_sources}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-store'})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Per-stage timings, TTS request outcomes and cache statistics in the Prometheus text format
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/autosave', methods=['POST'])
 def autosave():
     try:
@@ -293,15 +646,12 @@ def autosave():
         text = data.get('text', '')
         text_type = data.get('text_type')
 
-        if text_type == 'extracted_text':
-            save_text_to_file(text, EXTRACTED_TEXT_FILE)
-            session['extracted_text'] = text  # Save to session as well
-        elif text_type == 'conversation':
-            save_text_to_file(text, CONVERSATION_FILE)
-            session['conversation'] = text  # Save to session as well
-        else:
+        if text_type not in ('extracted_text', 'conversation'):
             return jsonify({'status': 'error', 'message': 'Invalid text type'}), 400
 
+        # Keystroke autosaves are coalesced and written once the text stops changing
+        workspace_store.autosave(get_workspace_id(), text_type, text)
+
         return jsonify({'status': 'success', 'message': 'Text autosaved successfully'}), 200
     except Exception as e:
         print(f"Error in autosave: {e}")
@@ -356,13 +706,15 @@ def process_question():
             cleanup_temp_file(temp_audio_path)
             return jsonify({'status': 'error', 'message': 'Failed to generate audio.'}), 500
 
-        # Combine the audio chunks
-        combined_audio_data = b''.join(audio_chunks)
+        # Combine the audio chunks into a single file in the requested format
+        output_format = resolve_output_format(request.form.get('format', AUDIO_OUTPUT_FORMAT))
+        combined_audio_data = encode_audio(audio_chunks, output_format)
 
         # Return the audio data as a response
         response = make_response(combined_audio_data)
-        response.headers.set('Content-Type', 'audio/mpeg')  # Adjust MIME type if using MP3
-        response.headers.set('Content-Disposition', 'attachment', filename='answer.mp3')
+        response.headers.set('Content-Type', OUTPUT_FORMATS[output_format]['mimetype'])
+        response.headers.set('Content-Disposition', 'attachment',
+                             filename=f"answer.{OUTPUT_FORMATS[output_format]['extension']}")
 
         # Cleanup temporary audio recording after processing
         cleanup_temp_file(temp_audio_path)
@@ -375,9 +727,46 @@ def process_question():
         return jsonify({'status': 'error', 'message': error_message}), 500
 
 
-# Constants for file paths
-EXTRACTED_TEXT_FILE = Path('text_files') /  'extracted_text.txt'
-CONVERSATION_FILE = Path('text_files') /  'conversation.txt'
+@app.route('/process_question_stream', methods=['POST'])
+def process_question_stream():
+    """
+    Answers a spoken question with streamed audio. Once the question is transcribed, the answer is
+    generated, split into sentences and synthesized concurrently, so the first sentence plays while
+    the rest is still being written. The transcription is returned URL-encoded in X-Transcription.
+    """
+    try:
+        if 'audio_data' not in request.files:
+            return jsonify({'status': 'error', 'message': 'No audio_data part in the request.'}), 400
+
+        audio_file = request.files['audio_data']
+        if audio_file.filename == '':
+            return jsonify({'status': 'error', 'message': 'No selected file.'}), 400
+
+        # Save the uploaded audio file temporarily for transcription
+        temp_audio_path = f"temp_audio_{uuid.uuid4().hex}.wav"
+        audio_file.save(temp_audio_path)
+        try:
+            transcription = transcribe_audio(temp_audio_path)
+        finally:
+            cleanup_temp_file(temp_audio_path)
+
+        if not transcription:
+            return jsonify({'status': 'error', 'message': 'Failed to transcribe audio.'}), 500
+        print(f"Transcription: {transcription}")
+
+        context = request.form.get('text_content', '').strip() or "Default context if none available."
+        speaker_voice = request.form.get('speaker1_voice', AVAILABLE_VOICES[0]['name'])
+        output_format = resolve_output_format(request.form.get('format', AUDIO_OUTPUT_FORMAT))
+
+        audio_stream = answer_question_stream(transcription, context, speaker_voice, output_format=output_format)
+        return Response(stream_with_context(audio_stream), mimetype=OUTPUT_FORMATS[output_format]['mimetype'],
+                        headers={'Cache-Control': 'no-store', 'X-Transcription': quote(transcription)})
+
+    except Exception as e:
+        error_message = f"An error occurred: {str(e)}"
+        print(error_message)
+        return jsonify({'status': 'error', 'message': error_message}), 500
+
 
 if __name__ == '__main__':
     # Ensure all necessary directories exist
@@ -0,0 +1,390 @@
+"""
+End-to-end benchmark of the PDF/website -> outline -> audio pipeline.
+
+Every external service is replaced by a local stand-in, so results only reflect this code:
+  - PDFs are generated on the fly and read with extract_text_from_pdf_pypdf2
+  - websites are served from a local HTTP server to extract_text_from_website
+  - the OpenAI chat completion is a stub with a simulated latency per generated token
+  - speech synthesis uses the local TTS backend (TTS_BACKEND=local)
+
+Usage:
+    python benchmarks/bench_pipeline.py --repeat 3 --output bench.json
+
+Results are printed as JSON (latency percentiles, throughput and the peak RSS sampled while each stage and input
+size runs), together with the current git commit, so runs can be compared across commits.
+"""
+import argparse
+import contextlib
+import http.server
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Configure the stand-ins before utils.utils reads its configuration at import time
+os.environ['TTS_BACKEND'] = 'local'
+os.environ.setdefault('LOCAL_TTS_LATENCY', '0.05')
+os.environ.setdefault('LOCAL_TTS_CHAR_LATENCY', '0.0005')
+for name in ('AZURE_OPENAI_ENDPOINT', 'AZURE_OPENAI_API_VERSION', 'AZURE_OPENAI_API_KEY', 'AZURE_OPENAI_MODEL_NAME'):
+    os.environ.setdefault(name, 'benchmark')
+
+sys.path.insert(0, str(REPO_ROOT))
+import openai  # noqa: E402
+from utils import utils  # noqa: E402
+from utils.disk_cache import DiskCache  # noqa: E402
+
+SENTENCE = "The quick brown fox jumps over the lazy dog while the band plays on. "
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process (ru_maxrss is in KiB on Linux and bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def _rss_of(pid):
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def current_rss_bytes():
+    """
+    Current resident set size of this process and its child processes (the PDF extraction pool parses pages in
+    worker processes), or None where /proc is not available.
+    """
+    try:
+        total = _rss_of('self')
+    except (OSError, ValueError, IndexError):
+        return None
+    for children in Path('/proc/self/task').glob('*/children'):
+        try:
+            pids = children.read_text().split()
+        except OSError:
+            continue
+        for pid in pids:
+            try:
+                total += _rss_of(pid)
+            except (OSError, ValueError, IndexError):
+                pass  # Exited meanwhile
+    return total
+
+
+class RSSSampler:
+    """
+    Samples the resident set size in a background thread while a stage runs, so each stage reports its own peak
+    rather than the process's peak so far. Falls back to the process peak where /proc is not available.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        # A failed read (e.g. /proc briefly unavailable) is skipped rather than ending the stage
+        if rss is not None:
+            self.peak = max(self.peak, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss_bytes()
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._thread is None:
+            self.peak = peak_rss_bytes()
+            return
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def report(self):
+        if self.baseline is None:
+            return {'peak_rss_bytes': self.peak, 'peak_rss_scope': 'process'}
+        return {'peak_rss_bytes': self.peak, 'peak_rss_growth_bytes': self.peak - self.baseline, 'peak_rss_scope': 'stage'}
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at `fraction` of the sorted values, or None if there are none."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, repeat, units):
+    """Runs func `repeat` times and summarizes its latency; units is the amount of work per run."""
+    latencies = []
+    with RSSSampler() as rss:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        'runs': repeat,
+        'p50_seconds': round(percentile(latencies, 0.50), 4),
+        'p90_seconds': round(percentile(latencies, 0.90), 4),
+        'p99_seconds': round(percentile(latencies, 0.99), 4),
+        'max_seconds': round(latencies[-1], 4),
+        'throughput_per_second': round(units / percentile(latencies, 0.50), 2),
+        **rss.report(),
+    }
+
+
+# Input generators
+
+def write_pdf(path, pages, lines_per_page=40):
+    """Writes a minimal text PDF (Helvetica, one text object per page) without extra dependencies."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        lines = ''.join(f"({page + 1}.{line + 1} {SENTENCE.strip()}) Tj T* " for line in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {lines}ET".encode('latin-1')
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {content_id} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>".encode()
+        )
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b''.join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    Path(path).write_bytes(bytes(output))
+
+
+def make_html(paragraphs):
+    body = ''.join(f"<p>{SENTENCE * 5}</p>\n" for _ in range(paragraphs))
+    return f"<html><head><title>Benchmark</title><script>var x = 1;</script></head><body><nav>Menu</nav>{body}</body></html>"
+
+
+def make_conversation(turns):
+    return '\n'.join(f"**Speaker{1 + turn % 2}:** {SENTENCE * (1 + turn % 3)}" for turn in range(turns))
+
+
+# Local stand-ins for external services
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    pages = {}
+
+    def do_GET(self):
+        body = self.pages.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubCompletions:
+    """Stands in for openai.chat.completions, generating a script of `turns` turns with a simulated token latency."""
+
+    def __init__(self, turns, first_token_latency, token_latency):
+        self.turns = turns
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        content = make_conversation(self.turns)
+        token_count = len(content) // 4
+        if stream:
+            return self._stream(content)
+        time.sleep(self.first_token_latency + self.token_latency * token_count)
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+    def _stream(self, content):
+        time.sleep(self.first_token_latency)
+        for start in range(0, len(content), 4):
+            time.sleep(self.token_latency)
+            delta = types.SimpleNamespace(content=content[start:start + 4])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+
+# Stages
+
+def bench_pdf(workdir, sizes, repeat):
+    results = []
+    for pages in sizes:
+        pdf_path = workdir / f"bench_{pages}.pdf"
+        write_pdf(pdf_path, pages)
+        stats = measure(lambda: utils.extract_text_from_pdf_pypdf2(pdf_path), repeat, pages)
+        results.append({'pages': pages, 'bytes': pdf_path.stat().st_size, **stats})
+    return results
+
+
+def bench_website(sizes, repeat):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = []
+    try:
+        for paragraphs in sizes:
+            FixtureHandler.pages[f"/page_{paragraphs}"] = make_html(paragraphs)
+            url = f"http://127.0.0.1:{server.server_port}/page_{paragraphs}"
+            stats = measure(lambda: utils.extract_text_from_website(url), repeat, paragraphs)
+            results.append({'paragraphs': paragraphs, 'bytes': len(FixtureHandler.pages[f"/page_{paragraphs}"]), **stats})
+    finally:
+        server.shutdown()
+    return results
+
+
+def bench_outline(sizes, repeat, first_token_latency, token_latency):
+    results = []
+    for turns in sizes:
+        openai.chat = types.SimpleNamespace(completions=StubCompletions(turns, first_token_latency, token_latency))
+        text = SENTENCE * 200
+        stats = measure(lambda: utils.generate_conversation(text, 'benchmark'), repeat, turns)
+        results.append({'turns': turns, **stats})
+    return results
+
+
+def bench_audio(sizes, repeat):
+    results = []
+    for turns in sizes:
+        conversation = make_conversation(turns)
+        breakdown = {}
+
+        def run():
+            start = time.perf_counter()
+            audio_file = utils.synthesize_speech(conversation, 'benchmark', 'en-US-GuyNeural', 'en-US-JennyNeural', use_cache=False)
+            breakdown['synthesize_seconds'] = round(time.perf_counter() - start, 4)
+            breakdown['output_bytes'] = (Path('static') / audio_file).stat().st_size
+
+        stats = measure(run, repeat, turns)
+        results.append({'turns': turns, **stats, **breakdown})
+    return results
+
+
+def bench_end_to_end(sizes, repeat, first_token_latency, token_latency):
+    """Streams text -> script -> audio and reports time to first audio as well as the total."""
+    get_tts_cache = utils.get_tts_cache
+    results = []
+    for turns in sizes:
+        openai.chat = types.SimpleNamespace(completions=StubCompletions(turns, first_token_latency, token_latency))
+        first_audio = []
+
+        def run():
+            # Every run starts with an empty TTS cache, otherwise repeats would replay the first run's audio
+            with tempfile.TemporaryDirectory(prefix='tts_cache_') as cache_dir:
+                cache = DiskCache(cache_dir, get_tts_cache().max_bytes, suffix='.wav')
+                utils.get_tts_cache = lambda: cache
+                start = time.perf_counter()
+                # As served by POST /stream_podcast: the script is written by a background job while the
+                # stream reads and synthesizes it
+                stream_id = uuid.uuid4().hex
+                utils.open_podcast_script(stream_id)
+                writer = threading.Thread(target=utils.write_podcast_script, args=(SENTENCE * 200, stream_id))
+                writer.start()
+                audio_stream = utils.podcast_script_stream(stream_id, 'en-US-GuyNeural', 'en-US-JennyNeural')
+                for n, _ in enumerate(audio_stream):
+                    if n == 1:
+                        first_audio.append(time.perf_counter() - start)
+                writer.join()
+
+        stats = measure(run, repeat, turns)
+        first_audio.sort()
+        # None when no run produced audio, e.g. because the stub script had no speaker lines
+        time_to_first_audio = percentile(first_audio, 0.5)
+        results.append({'turns': turns, 'time_to_first_audio_p50_seconds': time_to_first_audio and round(time_to_first_audio, 4),
+                        'runs_with_audio': len(first_audio), **stats})
+    utils.get_tts_cache = get_tts_cache
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per input size')
+    parser.add_argument('--stages', default='pdf,website,outline,audio,end_to_end', help='comma-separated stages to run')
+    parser.add_argument('--pdf-pages', default='10,50,200', help='PDF sizes in pages')
+    parser.add_argument('--html-paragraphs', default='10,100,1000', help='website sizes in paragraphs')
+    parser.add_argument('--turns', default='10,40,100', help='conversation sizes in turns')
+    parser.add_argument('--first-token-latency', type=float, default=0.3, help='stub LLM latency before the first token')
+    parser.add_argument('--token-latency', type=float, default=0.002, help='stub LLM latency per generated token')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    def sizes(value):
+        return [int(size) for size in value.split(',')]
+
+    stages = set(args.stages.split(','))
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'stages': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='podcast_bench_') as workdir:
+        workdir = Path(workdir)
+        # The pipeline writes to paths relative to the working directory (static/, cache/)
+        os.chdir(workdir)
+        for folder in ('static/audio', 'static/conversations'):
+            (workdir / folder).mkdir(parents=True, exist_ok=True)
+
+        # Keep the pipeline's progress output out of the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            if 'pdf' in stages:
+                report['stages']['pdf'] = bench_pdf(workdir, sizes(args.pdf_pages), args.repeat)
+            if 'website' in stages:
+                report['stages']['website'] = bench_website(sizes(args.html_paragraphs), args.repeat)
+            if 'outline' in stages:
+                report['stages']['outline'] = bench_outline(sizes(args.turns), args.repeat, args.first_token_latency, args.token_latency)
+            if 'audio' in stages:
+                report['stages']['audio'] = bench_audio(sizes(args.turns), args.repeat)
+            if 'end_to_end' in stages:
+                report['stages']['end_to_end'] = bench_end_to_end(sizes(args.turns), args.repeat, args.first_token_latency, args.token_latency)
+        os.chdir(REPO_ROOT)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
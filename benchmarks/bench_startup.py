@@ -0,0 +1,84 @@
+"""
+Startup time budget check for worker boot.
+
+Imports each target module in fresh interpreters, started in an empty working directory, and reports:
+  - the import time (median and max over the runs)
+  - heavy SDKs that were loaded by the import; they should be loaded on first use instead
+  - files or directories the import created; a worker boot should not touch the filesystem
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 5 --budget 1.0
+
+Results are printed as JSON. The exit status is 1 if a target exceeds the budget, loads a deferred SDK
+or writes to the working directory, so the check can run in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# SDKs that are only needed once a request uses the service
+DEFERRED_MODULES = ['openai', 'azure.cognitiveservices.speech', 'azure.ai.documentintelligence']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {target}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {deferred!r} if name in sys.modules]}}))
+"""
+
+
+def probe(target, workdir):
+    # The app creates the Azure speech backend in a background thread at startup; that is deliberate
+    # warm-up work, not import cost, so it is switched off here
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get('PYTHONPATH')])),
+               PYTHONDONTWRITEBYTECODE='1', AZURE_TTS_PREWARM='0')
+    output = subprocess.check_output([sys.executable, '-c', PROBE.format(target=target, deferred=DEFERRED_MODULES)],
+                                     cwd=workdir, env=env, text=True, stderr=subprocess.DEVNULL)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check(target, repeat, budget):
+    seconds = []
+    loaded = set()
+    created = set()
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix='podcast_startup_') as workdir:
+            result = probe(target, workdir)
+            seconds.append(result['seconds'])
+            loaded.update(result['loaded'])
+            created.update(str(path.relative_to(workdir)) for path in Path(workdir).rglob('*'))
+
+    median = statistics.median(seconds)
+    return {
+        'target': target,
+        'import_seconds_p50': round(median, 4),
+        'import_seconds_max': round(max(seconds), 4),
+        'budget_seconds': budget,
+        'deferred_modules_loaded': sorted(loaded),
+        'files_created': sorted(created),
+        'ok': median <= budget and not loaded and not created,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per target')
+    parser.add_argument('--budget', type=float, default=1.0, help='maximum median import time in seconds')
+    parser.add_argument('--targets', default='utils.utils,app', help='comma-separated modules to import')
+    args = parser.parse_args()
+
+    results = [check(target, args.repeat, args.budget) for target in args.targets.split(',')]
+    print(json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2))
+    sys.exit(0 if all(result['ok'] for result in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import utils  # noqa: E402
+from utils.disk_cache import DiskCache  # noqa: E402
+from utils.rate_limit import AdaptiveLimiter  # noqa: E402
+from utils.tts_backends import SynthesisResult  # noqa: E402
+
+
+class StubTTSBackend:
+    """
+    Returns the text of each SSML document as its audio, after `delays[text]` seconds (`latency` by default).
+    Texts in `throttle` fail as throttled the given number of times first; texts in `fail` always fail.
+    Records the text and monotonic time of every request in `calls`.
+    """
+
+    name = 'stub'
+    output_format = 'stub'
+    max_voice_elements = 50
+
+    def __init__(self, latency=0, delays=None, throttle=None, fail=()):
+        self.latency = latency
+        self.delays = delays or {}
+        self.throttle = dict(throttle or {})
+        self.fail = set(fail)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def synthesize(self, ssml):
+        text = ' '.join(re.sub(r'<[^>]+>', ' ', ssml).split())
+        with self._lock:
+            self.calls.append((text, time.monotonic()))
+            throttled = self.throttle.get(text, 0) > 0
+            if throttled:
+                self.throttle[text] -= 1
+        time.sleep(self.delays.get(text, self.latency))
+        if throttled:
+            return SynthesisResult(error="Error code: 4429. Too many requests.", throttled=True)
+        if text in self.fail:
+            return SynthesisResult(error="Invalid SSML.")
+        return SynthesisResult(text.encode('utf-8'))
+
+    def texts(self):
+        return [text for text, _ in self.calls]
+
+
+@pytest.fixture
+def use_backend(monkeypatch, tmp_path):
+    """
+    Routes synthesis to a backend (a StubTTSBackend built from the keyword arguments by default),
+    with a private rate limiter and TTS cache and no backoff delay between retries.
+    """
+    limiter = AdaptiveLimiter('tts', tmp_path / 'rate_limits.db', max_concurrency=8)
+    monkeypatch.setattr(utils, 'get_tts_limiter', lambda: limiter)
+    cache = DiskCache(tmp_path / 'tts', 10 * 1024 * 1024, suffix='.wav')
+    monkeypatch.setattr(utils, 'get_tts_cache', lambda: cache)
+    monkeypatch.setattr(utils, 'backoff_delay', lambda attempt, base=1.0, cap=30.0: 0)
+
+    def use(backend=None, **stub_options):
+        backend = backend or StubTTSBackend(**stub_options)
+        monkeypatch.setattr(utils, 'get_tts_backend', lambda: backend)
+        return backend
+
+    return use
+
+
+def make_lines(count, text="Line number {}."):
+    """Returns `count` (line_number, voice, text) tuples alternating between two voices."""
+    return [(i, f"voice-{i % 2}", text.format(i)) for i in range(count)]
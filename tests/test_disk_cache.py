@@ -0,0 +1,54 @@
+import sqlite3
+
+from conftest import make_lines
+from utils import utils
+from utils.disk_cache import DiskCache
+
+
+def test_entries_are_shared_between_instances(tmp_path):
+    writer = DiskCache(tmp_path, max_bytes=1000)
+    reader = DiskCache(tmp_path, max_bytes=1000)
+
+    writer.put('a' * 64, b'payload')
+
+    assert reader.get('a' * 64) == b'payload'
+    assert reader.get('b' * 64) is None
+    assert reader.stats()['entries'] == 1
+
+
+def test_least_recently_used_entries_are_evicted_across_instances(tmp_path):
+    first = DiskCache(tmp_path, max_bytes=25)
+    second = DiskCache(tmp_path, max_bytes=25)
+    keys = [str(n) * 64 for n in range(3)]
+
+    first.put(keys[0], b'x' * 10)
+    second.put(keys[1], b'x' * 10)
+    first.put(keys[2], b'x' * 10)
+
+    assert second.get(keys[0]) is None
+    assert [first.get(key) is not None for key in keys[1:]] == [True, True]
+    assert first.stats()['bytes'] == 20
+
+
+def test_hits_do_not_wait_for_the_write_lock(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=1000)
+    cache.put('a' * 64, b'payload')
+    blocker = sqlite3.connect(tmp_path / DiskCache.INDEX_NAME, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        # Within ACCESS_RESOLUTION of the last access, a hit only reads the index
+        assert cache.get('a' * 64) == b'payload'
+    finally:
+        blocker.rollback()
+        blocker.close()
+
+
+def test_cached_lines_are_not_synthesized_again(use_backend):
+    lines = make_lines(4)
+    backend = use_backend()
+
+    first = list(utils.iter_synthesized_lines(lines, concurrency=2))
+    second = list(utils.iter_synthesized_lines(lines, concurrency=2))
+
+    assert second == first
+    assert len(backend.calls) == len(lines)
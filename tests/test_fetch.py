@@ -0,0 +1,39 @@
+import http.server
+import threading
+
+import pytest
+
+from utils.fetch import HTTPFetcher
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    content_type = 'text/html; charset=utf-8'
+
+    def do_GET(self):
+        body = 'Café'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', self.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+
+
+@pytest.mark.parametrize('content_type', ['text/html; charset=utf-8', 'text/html; charset=bogus-8'])
+def test_body_is_decoded_with_the_declared_or_fallback_charset(server, tmp_path, monkeypatch, content_type):
+    monkeypatch.setattr(Handler, 'content_type', content_type)
+    fetcher = HTTPFetcher(tmp_path, 1024 * 1024)
+
+    assert fetcher.fetch(server).text == 'Café'
+    # Served from the cache, with the same stored charset
+    assert fetcher.fetch(server).text == 'Café'
@@ -0,0 +1,64 @@
+import threading
+
+from conftest import make_lines
+from utils import utils
+from utils.rate_limit import AdaptiveLimiter
+
+
+def test_throttling_halves_the_limit_once_per_cooldown(tmp_path):
+    limiter = AdaptiveLimiter('test', tmp_path / 'limits.db', max_concurrency=8, decrease_cooldown=60)
+
+    for _ in range(3):
+        limiter.release(limiter.acquire(), 'throttled')
+    # Successes during the cooldown do not undo the decrease
+    limiter.release(limiter.acquire(), 'success')
+
+    assert limiter.stats()['concurrency'] == 4
+
+
+def test_success_raises_the_limit_up_to_the_maximum(tmp_path):
+    limiter = AdaptiveLimiter('test', tmp_path / 'limits.db', max_concurrency=4, decrease_cooldown=0)
+    limiter.release(limiter.acquire(), 'throttled')
+
+    for _ in range(20):
+        limiter.release(limiter.acquire(), 'success')
+
+    assert limiter.stats()['concurrency'] == 4
+
+
+def test_limit_is_shared_through_the_database(tmp_path):
+    first = AdaptiveLimiter('test', tmp_path / 'limits.db', max_concurrency=2)
+    second = AdaptiveLimiter('test', tmp_path / 'limits.db', max_concurrency=2)
+    leases = [first.acquire(), first.acquire()]
+    acquired = threading.Event()
+
+    def acquire():
+        second.release(second.acquire())
+        acquired.set()
+
+    threading.Thread(target=acquire, daemon=True).start()
+    assert not acquired.wait(0.3)
+    first.release(leases.pop())
+    assert acquired.wait(2)
+    first.release(leases.pop())
+
+
+def test_throttled_synthesis_lowers_the_shared_limit(use_backend):
+    lines = make_lines(4)
+    use_backend(throttle={lines[1][2]: 1})
+
+    list(utils.iter_synthesized_lines(lines, concurrency=2, use_cache=False))
+
+    assert utils.get_tts_limiter().stats()['concurrency'] < 8
+
+
+def test_limiter_settings_are_read_on_first_use(monkeypatch, tmp_path):
+    monkeypatch.setenv('RATE_LIMIT_DB', str(tmp_path / 'limits.db'))
+    monkeypatch.setenv('MAX_CONCURRENT_LLM_REQUESTS', '3')
+    utils.get_openai_limiter.reset()
+    try:
+        limiter = utils.get_openai_limiter()
+        assert limiter.max_concurrency == 3
+        assert limiter.db_path == tmp_path / 'limits.db'
+    finally:
+        utils.get_openai_limiter.reset()
@@ -0,0 +1,51 @@
+import os
+import time
+
+from utils import utils
+from utils.retention import RetentionManager, RetentionPolicy
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_expired_files_are_removed_unless_in_use(tmp_path):
+    old, held, recent = (tmp_path / f"podcast_{name}.mp3" for name in ('old', 'held', 'recent'))
+    for path in (old, held, recent):
+        path.write_bytes(b'x' * 10)
+    age(old, 7200)
+    age(held, 7200)
+    manager = RetentionManager([RetentionPolicy('podcasts', tmp_path, 'podcast_*', max_age=3600, min_age=0)])
+
+    with manager.in_use(held):
+        report = manager.sweep()
+
+    assert not old.exists() and held.exists() and recent.exists()
+    assert report['podcasts'] == {'removed_files': 1, 'reclaimed_bytes': 10, 'remaining_files': 2, 'remaining_bytes': 20}
+
+
+def test_least_recently_used_files_are_removed_over_quota(tmp_path):
+    paths = [tmp_path / f"podcast_{n}.mp3" for n in range(3)]
+    for n, path in enumerate(paths):
+        path.write_bytes(b'x' * 10)
+        age(path, 300 - n * 100)
+    manager = RetentionManager([RetentionPolicy('podcasts', tmp_path, 'podcast_*', max_bytes=20, min_age=0)])
+
+    manager.sweep()
+
+    assert [path.exists() for path in paths] == [False, True, True]
+
+
+def test_limits_are_read_when_the_manager_is_created(monkeypatch):
+    monkeypatch.setenv('PODCASTS_MAX_BYTES', '42')
+    monkeypatch.setenv('TTS_CACHE_MAX_BYTES', '4242')
+    for getter in (utils.get_retention, utils.get_tts_cache):
+        getter.reset()
+    try:
+        policies = {policy.name: policy for policy in utils.get_retention().policies}
+        assert policies['podcasts'].max_bytes == 42
+        assert utils.get_tts_cache().max_bytes == 4242
+    finally:
+        for getter in (utils.get_retention, utils.get_tts_cache):
+            getter.reset()
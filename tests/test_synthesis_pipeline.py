@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+# Importing utils needs no Azure configuration: clients, limiters and caches are created on first use
+from conftest import make_lines
+from utils import utils
+
+
+def test_lines_are_yielded_in_script_order(use_backend):
+    lines = make_lines(8)
+    # Earlier lines take longer, so they finish after the lines that follow them
+    backend = use_backend(delays={text: 0.02 * (8 - i) for i, _, text in lines})
+
+    results = list(utils.iter_synthesized_lines(lines, concurrency=4, use_cache=False))
+
+    assert [i for i, _ in results] == [i for i, _, _ in lines]
+    assert [audio.decode('utf-8') for _, audio in results] == [text for _, _, text in lines]
+    assert len(backend.calls) == len(lines)
+
+
+def test_lazy_lines_are_yielded_in_script_order(use_backend):
+    lines = make_lines(5)
+    use_backend(delays={lines[0][2]: 0.1})
+
+    def produce():
+        for line in lines:
+            time.sleep(0.01)
+            yield line
+
+    results = list(utils.iter_synthesized_lines(produce(), concurrency=3, use_cache=False))
+
+    assert [i for i, _ in results] == [i for i, _, _ in lines]
+
+
+def test_throttled_line_is_retried(use_backend):
+    lines = make_lines(4)
+    throttled_text = lines[2][2]
+    backend = use_backend(throttle={throttled_text: 2})
+
+    results = list(utils.iter_synthesized_lines(lines, concurrency=2, use_cache=False))
+
+    assert [audio.decode('utf-8') for _, audio in results] == [text for _, _, text in lines]
+    assert backend.texts().count(throttled_text) == 3
+
+
+def test_failed_line_raises(use_backend):
+    lines = make_lines(3)
+    backend = use_backend(fail={lines[1][2]})
+
+    with pytest.raises(RuntimeError, match='line 1'):
+        list(utils.iter_synthesized_lines(lines, concurrency=2, use_cache=False))
+    # Errors other than throttling are not retried
+    assert backend.texts().count(lines[1][2]) == 1
+
+
+def test_wall_clock_scales_with_concurrency(use_backend):
+    lines = make_lines(24)
+    latency = 0.1
+    concurrency = 8
+    use_backend(latency=latency)
+
+    start = time.monotonic()
+    results = list(utils.iter_synthesized_lines(lines, concurrency=concurrency, use_cache=False))
+    elapsed = time.monotonic() - start
+
+    assert len(results) == len(lines)
+    # Serially this takes len(lines) * latency (2.4 s); with 8 workers, 3 rounds of 0.1 s plus overhead
+    assert elapsed < len(lines) * latency / concurrency * 2.5
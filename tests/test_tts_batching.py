@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from conftest import make_lines
+from utils import utils
+from utils.tts_backends import LocalTTSBackend
+
+
+def test_batched_lines_are_split_per_line(use_backend):
+    lines = make_lines(6)
+    use_backend(LocalTTSBackend(latency=0, char_latency=0))
+    single = list(utils.iter_synthesized_lines(lines, concurrency=2, use_cache=False))
+
+    batched = list(utils.iter_synthesized_lines(lines, concurrency=2, use_cache=False, batch_chars=1000))
+
+    assert [i for i, _ in batched] == [i for i, _, _ in lines]
+    assert [len(audio) for _, audio in batched] == [len(audio) for _, audio in single]
+
+
+class CountingLocalBackend(LocalTTSBackend):
+    def __init__(self):
+        super().__init__(latency=0, char_latency=0)
+        self.requests = 0
+        self.voice_elements = []
+
+    def synthesize(self, ssml):
+        self.requests += 1
+        self.voice_elements.append(ssml.count('<voice '))
+        return super().synthesize(ssml)
+
+
+def test_buffered_lines_are_batched(use_backend):
+    lines = make_lines(6)
+    backend = use_backend(CountingLocalBackend())
+
+    results = list(utils.iter_synthesized_lines(lines, concurrency=1, use_cache=False, batch_chars=1000))
+
+    assert len(results) == len(lines)
+    assert backend.requests == 1
+
+
+def test_batches_respect_the_voice_element_limit(use_backend):
+    lines = make_lines(120, text="Hi {}.")
+    backend = use_backend(CountingLocalBackend())
+
+    results = list(utils.iter_synthesized_lines(lines, concurrency=1, use_cache=False, batch_chars=100_000))
+
+    assert len(results) == len(lines)
+    assert backend.voice_elements == [50, 50, 20]
+
+
+@pytest.mark.parametrize('batch_chars', [0, 1000])
+def test_lazy_line_is_synthesized_before_the_next_one_arrives(use_backend, batch_chars):
+    lines = make_lines(3)
+    backend = use_backend()
+    produced_at = []
+
+    def produce():
+        for line in lines:
+            produced_at.append(time.monotonic())
+            yield line
+            time.sleep(0.3)
+
+    results = list(utils.iter_synthesized_lines(produce(), concurrency=2, use_cache=False, batch_chars=batch_chars))
+
+    assert [i for i, _ in results] == [0, 1, 2]
+    # Each line reaches the backend while the producer is still working on the next one
+    assert [text for text, _ in backend.calls] == [text for _, _, text in lines]
+    for (_, requested_at), next_produced_at in zip(backend.calls, produced_at[1:]):
+        assert requested_at < next_produced_at
@@ -0,0 +1,249 @@
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import wave
+
+# Encoder used for compressed output formats; any FFmpeg build with libmp3lame and libopus will do
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+
+# Output formats: file extension, MIME type and the FFmpeg arguments that encode 16-bit PCM into them
+OUTPUT_FORMATS = {
+    'wav': {'extension': 'wav', 'mimetype': 'audio/wav', 'ffmpeg_args': None},
+    'mp3': {'extension': 'mp3', 'mimetype': 'audio/mpeg', 'ffmpeg_args': ['-c:a', 'libmp3lame', '-b:a', '48k', '-f', 'mp3']},
+    'opus': {'extension': 'opus', 'mimetype': 'audio/ogg', 'ffmpeg_args': ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip', '-f', 'ogg']},
+}
+
+
+def split_wav(data):
+    """
+    Splits a RIFF/WAV payload into its format and PCM data without copying the samples.
+    Returns ((channels, sample_width, frame_rate), pcm) where pcm is a memoryview.
+    """
+    view = memoryview(data)
+    if len(view) < 12 or bytes(view[0:4]) != b'RIFF' or bytes(view[8:12]) != b'WAVE':
+        raise ValueError("Audio data is not a RIFF/WAV payload.")
+
+    params = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from('<I', view, offset + 4)[0]
+        body = offset + 8
+
+        if chunk_id == b'fmt ':
+            channels, frame_rate = struct.unpack_from('<HI', view, body + 2)
+            bits_per_sample = struct.unpack_from('<H', view, body + 14)[0]
+            params = (channels, bits_per_sample // 8, frame_rate)
+        elif chunk_id == b'data':
+            if params is None:
+                raise ValueError("WAV data chunk appears before its fmt chunk.")
+            # Streamed WAV headers may leave the data size unset; take the remainder in that case
+            end = len(view) if chunk_size in (0, 0xFFFFFFFF) else min(body + chunk_size, len(view))
+            return params, view[body:end]
+
+        # Chunks are padded to an even number of bytes
+        offset = body + chunk_size + (chunk_size & 1)
+
+    raise ValueError("WAV payload has no data chunk.")
+
+
+def split_pcm_at_offsets(params, pcm, offsets):
+    """
+    Splits PCM data at audio offsets given in 100-nanosecond ticks, as reported by Azure Speech events.
+    Returns one PCM slice per offset, each running until the next offset (the last one until the end).
+    """
+    channels, sample_width, frame_rate = params
+    block_align = channels * sample_width
+    total_frames = len(pcm) // block_align
+    boundaries = [min(total_frames, round(offset * frame_rate / 10_000_000)) for offset in offsets]
+    boundaries[0] = 0
+    if boundaries != sorted(boundaries):
+        raise ValueError("Audio offsets are not in ascending order.")
+    boundaries.append(total_frames)
+    return [pcm[start * block_align:end * block_align] for start, end in zip(boundaries, boundaries[1:])]
+
+
+def _fmt_chunk(params):
+    channels, sample_width, frame_rate = params
+    block_align = channels * sample_width
+    return b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, frame_rate, frame_rate * block_align, block_align, sample_width * 8)
+
+
+def build_wav(params, pcm):
+    """Wraps PCM data in a complete WAV header."""
+    return b'RIFF' + struct.pack('<I', 36 + len(pcm)) + b'WAVE' + _fmt_chunk(params) + b'data' + struct.pack('<I', len(pcm)) + bytes(pcm)
+
+
+def wav_stream_header(params):
+    """
+    Builds a WAV header for a stream of unknown length.
+    The RIFF and data sizes are set to their maximum so players keep reading until the connection closes.
+    """
+    return b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' + _fmt_chunk(params) + b'data' + struct.pack('<I', 0xFFFFFFFF)
+
+
+class WavWriter:
+    """
+    Writes PCM chunks to a single WAV file as they arrive.
+    The header is written once and its sizes are patched when the writer is closed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.params = None
+        self._wav_file = None
+
+    def write(self, params, pcm):
+        if self._wav_file is None:
+            self._wav_file = wave.open(str(self.path), 'wb')
+            self._wav_file.setnchannels(params[0])
+            self._wav_file.setsampwidth(params[1])
+            self._wav_file.setframerate(params[2])
+            self.params = params
+        elif params != self.params:
+            raise ValueError(f"Audio format {params} does not match the output format {self.params}.")
+        self._wav_file.writeframesraw(pcm)
+
+    def close(self):
+        if self._wav_file is not None:
+            self._wav_file.close()
+            self._wav_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def resolve_output_format(output_format):
+    """
+    Returns the output format to use for a requested one: the format itself if it is known and can be
+    encoded here, otherwise 'wav', which needs no encoder.
+    """
+    output_format = (output_format or 'wav').lower()
+    if output_format not in OUTPUT_FORMATS:
+        print(f"Unknown audio output format '{output_format}'. Using wav.")
+        return 'wav'
+    if OUTPUT_FORMATS[output_format]['ffmpeg_args'] and not shutil.which(FFMPEG_BINARY):
+        print(f"FFmpeg is not available to encode {output_format}. Using wav.")
+        return 'wav'
+    return output_format
+
+
+def mimetype_for_file(filename):
+    """Returns the MIME type of an audio file produced in one of the output formats."""
+    extension = str(filename).rsplit('.', 1)[-1].lower()
+    for output_format in OUTPUT_FORMATS.values():
+        if output_format['extension'] == extension:
+            return output_format['mimetype']
+    return 'application/octet-stream'
+
+
+def _ffmpeg_command(params, output_format, output):
+    channels, sample_width, frame_rate = params
+    if sample_width != 2:
+        raise ValueError(f"Only 16-bit PCM can be encoded, got {sample_width * 8}-bit samples.")
+    return [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-nostdin',
+            '-f', 's16le', '-ar', str(frame_rate), '-ac', str(channels), '-i', 'pipe:0',
+            *OUTPUT_FORMATS[output_format]['ffmpeg_args'], '-y', output]
+
+
+class EncodedAudioWriter:
+    """
+    Writes PCM chunks to a compressed audio file as they arrive, with the same interface as WavWriter.
+    The PCM data is piped into an FFmpeg process that encodes it incrementally, so the uncompressed
+    audio is never held in memory or written to disk.
+    """
+
+    def __init__(self, path, output_format):
+        self.path = path
+        self.output_format = output_format
+        self.params = None
+        self._process = None
+
+    def write(self, params, pcm):
+        if self._process is None:
+            self._process = subprocess.Popen(_ffmpeg_command(params, self.output_format, str(self.path)),
+                                             stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.params = params
+        elif params != self.params:
+            raise ValueError(f"Audio format {params} does not match the output format {self.params}.")
+        self._process.stdin.write(pcm)
+
+    def close(self):
+        if self._process is not None:
+            process, self._process = self._process, None
+            process.stdin.close()
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                raise RuntimeError(f"FFmpeg failed to encode {self.path}: {stderr.decode(errors='replace').strip()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_audio_writer(path, output_format):
+    """Returns a writer for the output format: a WavWriter for 'wav', an EncodedAudioWriter otherwise."""
+    if OUTPUT_FORMATS[output_format]['ffmpeg_args'] is None:
+        return WavWriter(path)
+    return EncodedAudioWriter(path, output_format)
+
+
+def encode_stream(chunks, output_format, read_size=16384):
+    """
+    Encodes an iterator of (params, pcm) chunks into a byte stream in the output format.
+    WAV streams get a header followed by the raw PCM data. Compressed formats are encoded by FFmpeg:
+    a feeder thread pipes the PCM data in while encoded bytes are yielded as soon as FFmpeg emits them.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return
+    params, pcm = first
+
+    if OUTPUT_FORMATS[output_format]['ffmpeg_args'] is None:
+        yield wav_stream_header(params)
+        yield bytes(pcm)
+        for _, pcm in chunks:
+            yield bytes(pcm)
+        return
+
+    process = subprocess.Popen(_ffmpeg_command(params, output_format, 'pipe:1'),
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def feed():
+        try:
+            process.stdin.write(pcm)
+            for _, chunk in chunks:
+                process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            # The encoder was stopped because the consumer went away
+            pass
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name='audio-encoder-feed', daemon=True)
+    feeder.start()
+    try:
+        while True:
+            data = process.stdout.read1(read_size)
+            if not data:
+                break
+            yield data
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
@@ -0,0 +1,91 @@
+import functools
+import os
+import threading
+
+from utils.tts_backends import create_tts_backend
+
+# Service clients are created on first use rather than at import, so starting a worker does no network
+# or SDK initialization work, and a missing configuration only affects the features that need it.
+
+
+def lazy_client(factory):
+    """
+    Turns a factory into a thread-safe accessor that calls it once, on first use, and returns the cached result.
+    A factory that raises is retried on the next call.
+    """
+    lock = threading.Lock()
+    created = []
+
+    @functools.wraps(factory)
+    def get():
+        if not created:
+            with lock:
+                if not created:
+                    created.append(factory())
+        return created[0]
+
+    def reset():
+        with lock:
+            created.clear()
+
+    get.reset = reset
+    return get
+
+
+@lazy_client
+def get_openai():
+    """Returns the openai module configured for Azure OpenAI. Raises ValueError if the configuration is incomplete."""
+    import openai
+
+    openai.api_type = "azure"
+    openai.api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
+    openai.api_version = os.getenv("AZURE_OPENAI_API_VERSION")
+    openai.api_key = os.getenv("AZURE_OPENAI_API_KEY")
+    if not all([openai.api_base, openai.api_version, openai.api_key, os.getenv("AZURE_OPENAI_MODEL_NAME")]):
+        raise ValueError("Azure OpenAI configuration is incomplete.")
+    return openai
+
+
+def get_openai_model():
+    """
+    Returns the Azure OpenAI deployment used for scripts and summaries. It is read on first use, like the other
+    OpenAI settings and validated with them, so a .env loaded after import applies. Raises ValueError if unset.
+    """
+    get_openai()
+    return os.getenv("AZURE_OPENAI_MODEL_NAME")
+
+
+@lazy_client
+def get_document_intelligence_client():
+    """Returns the Azure Document Intelligence client, or None if it is not configured."""
+    try:
+        from azure.core.credentials import AzureKeyCredential
+        from azure.ai.documentintelligence import DocumentIntelligenceClient
+
+        if not os.getenv("DOCUMENTINTELLIGENCE_ENDPOINT") or not os.getenv("DOCUMENTINTELLIGENCE_API_KEY"):
+            raise ValueError("Azure Document Intelligence configuration is incomplete.")
+        return DocumentIntelligenceClient(
+            endpoint=os.getenv("DOCUMENTINTELLIGENCE_ENDPOINT"),
+            credential=AzureKeyCredential(os.getenv("DOCUMENTINTELLIGENCE_API_KEY"))
+        )
+    except Exception as e:
+        print(f"Error initializing Azure Document Intelligence client: {e}")
+        return None
+
+
+@lazy_client
+def get_speech_config():
+    """Returns the Azure Speech Service config, or None if it could not be created."""
+    try:
+        import azure.cognitiveservices.speech as speechsdk
+
+        return speechsdk.SpeechConfig(subscription=os.getenv("SPEECH_KEY_NEW"), region="swedencentral")
+    except Exception as e:
+        print(f"Error initializing Azure Speech Service config: {e}")
+        return None
+
+
+@lazy_client
+def get_tts_backend():
+    """Returns the speech synthesis backend selected with TTS_BACKEND, or None if it is not available."""
+    return create_tts_backend(get_speech_config)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+class DiskCache:
+    """
+    Content-addressed cache of byte payloads stored as files under `directory`.
+    The total size is bounded by `max_bytes`; the least recently used entries are evicted first.
+    The index of entries (size and last access) is a SQLite database next to the files, so every process
+    using the directory sees the same entries and eviction accounts for all of them. Entries survive restarts.
+    """
+
+    INDEX_NAME = 'index.db'
+    # Hits refresh the last access time at most this often, so reads rarely have to write
+    ACCESS_RESOLUTION = 60
+
+    def __init__(self, directory, max_bytes, suffix=''):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._lock = threading.Lock()  # Guards the counters
+
+    @staticmethod
+    def make_key(*parts):
+        """Hashes the given JSON-serializable parts into a cache key."""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        # Shard by the first two hex digits to keep directories small
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.directory / self.INDEX_NAME, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS entries (
+                            key TEXT PRIMARY KEY,
+                            size INTEGER NOT NULL,
+                            accessed_at REAL NOT NULL
+                        )
+                    """)
+                    connection.execute("CREATE INDEX IF NOT EXISTS entries_by_access ON entries (accessed_at)")
+                    self._import_files(connection)
+                    self._initialized = True
+            self._local.connection = connection
+        return connection
+
+    def _import_files(self, connection):
+        """Indexes entries written before the index existed, ordered by their modification time."""
+        if connection.execute("SELECT 1 FROM entries LIMIT 1").fetchone():
+            return
+        rows = []
+        for path in self.directory.glob(f"*/*{self.suffix}"):
+            if path.name.endswith('.tmp'):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            key = path.name[:len(path.name) - len(self.suffix)] if self.suffix else path.name
+            rows.append((key, stat.st_size, stat.st_mtime))
+        if rows:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?)", rows)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        """Returns the cached payload for key, or None if it is not cached."""
+        connection = self._connection()
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            # Never written, or evicted by any process; make sure the index forgets it
+            if connection.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._count('misses')
+            return None
+
+        now = time.time()
+        row = connection.execute("SELECT accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+        # Only a stale access time needs the write lock. The row may also be missing if the file was written
+        # by a process whose index update has not landed yet
+        if row is None or row[0] < now - self.ACCESS_RESOLUTION:
+            try:
+                with connection:
+                    connection.execute("INSERT OR IGNORE INTO entries VALUES (?, ?, ?)", (key, len(data), now))
+                    connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ? AND accessed_at < ?",
+                                       (now, key, now - self.ACCESS_RESOLUTION))
+            except sqlite3.OperationalError as e:
+                # The access time only orders evictions; the hit itself is still good
+                logging.warning(f"Could not record the access to cache entry {key}: {e}")
+        self._count('hits')
+        return data
+
+    def put(self, key, data):
+        """Stores data under key, then evicts least recently used entries beyond max_bytes."""
+        if len(data) > self.max_bytes:
+            return
+        connection = self._connection()
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.error(f"Error writing cache entry {path}: {e}")
+            return
+
+        evicted = []
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, len(data), time.time()))
+            total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total_bytes > self.max_bytes:
+                for old_key, size in connection.execute(
+                    "SELECT key, size FROM entries WHERE key != ? ORDER BY accessed_at", (key,)
+                ):
+                    if total_bytes <= self.max_bytes:
+                        break
+                    evicted.append(old_key)
+                    total_bytes -= size
+                connection.executemany("DELETE FROM entries WHERE key = ?", [(old_key,) for old_key in evicted])
+
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+        with self._lock:
+            self.evictions += len(evicted)
+
+    def stats(self):
+        """Returns this process's hit/miss counters and the current size of the cache, across all processes."""
+        entries, total_bytes = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': total_bytes,
+                'max_bytes': self.max_bytes,
+            }
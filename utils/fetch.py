@@ -0,0 +1,154 @@
+import codecs
+import json
+import logging
+import os
+import re
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import get_encoding_from_headers
+
+from utils.disk_cache import DiskCache
+
+
+class ResponseTooLarge(requests.RequestException):
+    """Raised when a response body exceeds the fetcher's size limit."""
+
+
+class FetchResult:
+    """A fetched document: the final URL, its Content-Type, the decoded body and whether it came from the cache."""
+
+    def __init__(self, url, content_type, text, from_cache=False):
+        self.url = url
+        self.content_type = content_type
+        self.text = text
+        self.from_cache = from_cache
+
+
+def _max_age(cache_control):
+    """Returns the max-age of a Cache-Control header in seconds, 0 if absent, or None if the response must not be stored."""
+    directives = cache_control.lower()
+    if 'no-store' in directives or 'private' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    match = re.search(r'max-age=(\d+)', directives)
+    return int(match.group(1)) if match else 0
+
+
+class HTTPFetcher:
+    """
+    Fetches web pages through one pooled requests.Session, so connections to the same host are reused.
+    Responses that carry an ETag, Last-Modified or max-age are kept in an on-disk cache: fresh entries are
+    served without a request, stale ones are revalidated with a conditional GET and reused on 304 Not Modified.
+    Bodies are streamed and the download is aborted once it exceeds `max_body_bytes`.
+    """
+
+    def __init__(self, cache_dir, cache_max_bytes, max_body_bytes=10 * 1024 * 1024, timeout=(5, 15),
+                 pool_size=16, user_agent="Mozilla/5.0 (compatible; PodcastGenerator/1.0; +http://yourdomain.com/bot)"):
+        self.cache = DiskCache(cache_dir, cache_max_bytes, suffix='.http')
+        self.max_body_bytes = max_body_bytes
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.user_agent = user_agent
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=1)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = self.user_agent
+                self._session = session
+            return self._session
+
+    def _load(self, key):
+        payload = self.cache.get(key)
+        if payload is None:
+            return None, None
+        header, _, body = payload.partition(b'\n')
+        return json.loads(header), body
+
+    def _store(self, key, meta, body):
+        self.cache.put(key, json.dumps(meta).encode('utf-8') + b'\n' + body)
+
+    def _read_body(self, response):
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            raise ResponseTooLarge(f"Response of {content_length} bytes exceeds the limit of {self.max_body_bytes} bytes.")
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise ResponseTooLarge(f"Response exceeds the limit of {self.max_body_bytes} bytes.")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    @staticmethod
+    def _result(meta, body, from_cache):
+        encoding = meta.get('encoding') or 'utf-8'
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            # A charset Python does not know, e.g. a typo in the server's Content-Type
+            logging.warning(f"Unknown charset {encoding!r} for {meta['url']}; decoding as UTF-8.")
+            encoding = 'utf-8'
+        return FetchResult(meta['url'], meta.get('content_type', ''), body.decode(encoding, errors='replace'), from_cache)
+
+    def fetch(self, url):
+        """Returns a FetchResult for the URL. Raises requests.RequestException on errors and non-2xx responses."""
+        key = DiskCache.make_key('GET', url)
+        meta, body = self._load(key)
+        if meta is not None and time.time() < meta.get('expires', 0):
+            return self._result(meta, body, from_cache=True)
+
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and meta is not None:
+                max_age = _max_age(response.headers.get('Cache-Control', ''))
+                meta['expires'] = time.time() + (max_age or 0)
+                self._store(key, meta, body)
+                logging.info(f"Website {url} not modified; using the cached copy.")
+                return self._result(meta, body, from_cache=True)
+
+            response.raise_for_status()
+            body = self._read_body(response)
+            content_type = response.headers.get('Content-Type', '')
+            meta = {
+                'url': response.url,
+                'content_type': content_type,
+                # Pages without a charset are almost always UTF-8 nowadays
+                'encoding': get_encoding_from_headers(response.headers) if 'charset' in content_type.lower() else 'utf-8',
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            max_age = _max_age(response.headers.get('Cache-Control', ''))
+
+        if max_age is not None and (max_age or meta['etag'] or meta['last_modified']):
+            meta['expires'] = time.time() + max_age
+            self._store(key, meta, body)
+        return self._result(meta, body, from_cache=False)
+
+
+def default_html_parser():
+    """Returns the BeautifulSoup parser to use: HTML_PARSER if set, else lxml when installed, else html.parser."""
+    parser = os.getenv('HTML_PARSER')
+    if parser:
+        return parser
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
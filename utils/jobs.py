@@ -0,0 +1,243 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the job queue is at capacity."""
+
+
+class Job:
+    """A unit of background work and its progress as reported to clients."""
+
+    def __init__(self, kind, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._on_change = on_change  # Called with the job after each update, e.g. to persist it
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds a job reported by another process from its to_dict() fields."""
+        job = cls(data['kind'])
+        job.id = data['job_id']
+        for field in ('status', 'stage', 'done', 'total', 'result', 'error', 'created_at', 'started_at',
+                      'finished_at'):
+            setattr(job, field, data[field])
+        return job
+
+    def update(self, stage=None, done=None, total=None):
+        """Reports progress from inside the job function."""
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+        if self._on_change:
+            self._on_change(self)
+
+    def eta_seconds(self):
+        """Estimates the remaining time from the progress made so far, or None if unknown."""
+        if self.status != 'running' or not self.total or not self.done:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed / self.done * (self.total - self.done), 1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'stage': self.stage,
+                'done': self.done,
+                'total': self.total,
+                'eta_seconds': self.eta_seconds(),
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+
+
+class JobManager:
+    """
+    Runs jobs on a fixed pool of worker threads fed by a bounded queue.
+    submit() raises QueueFull instead of blocking when the queue is full, so callers can apply back-pressure.
+    Finished jobs are kept for `ttl` seconds so clients can poll their result.
+
+    With a `db_path`, job state is also written to a SQLite database in WAL mode, so any worker process can
+    report the status of a job another one runs. Each process runs the jobs submitted to it and refreshes their
+    heartbeat; queued or running jobs whose heartbeat stops (the process died) are reported as failed.
+    Without one, jobs are only visible to the process that runs them, which requires a single worker process.
+    """
+
+    # Progress updates are written at most this often; status changes are always written
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, workers=2, max_queued=20, ttl=3600, db_path=None, heartbeat=10.0):
+        self.workers = workers
+        self.ttl = ttl
+        self.db_path = Path(db_path) if db_path else None
+        self.heartbeat = heartbeat
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._saved_at = {}  # job id -> time its state was last written
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Keeps a state read before a newer one from being written after it
+        self._threads = []
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    finished_at REAL,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+            self._local.connection = connection
+        return connection
+
+    def _save(self, job, force=True):
+        """Writes the job's state to the database, skipping progress updates made within SAVE_INTERVAL."""
+        if self.db_path is None:
+            return
+        now = time.time()
+        with self._lock:
+            if not force and now - self._saved_at.get(job.id, 0) < self.SAVE_INTERVAL:
+                return
+            self._saved_at[job.id] = now
+        try:
+            with self._save_lock:
+                state = job.to_dict()
+                self._connection().execute(
+                    "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)",
+                    (job.id, json.dumps(state), state['finished_at'], now)
+                )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.error(f"Error saving job {job.id}: {e}")
+
+    def _start_workers(self):
+        # Workers start on first use so importing the app does not spawn threads
+        if self._threads:
+            return
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.db_path is not None:
+            thread = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind, func, *args, **kwargs):
+        """
+        Queues func(job, *args, **kwargs) and returns the Job.
+        The function's return value becomes the job result and must be JSON-serializable when jobs are stored
+        in a database; an exception marks the job as failed.
+        """
+        job = Job(kind, on_change=lambda job: self._save(job, force=False))
+        with self._lock:
+            self._prune()
+            self._start_workers()
+            try:
+                self._queue.put_nowait((job, func, args, kwargs))
+            except queue.Full:
+                raise QueueFull(f"The job queue is full ({self._queue.maxsize} jobs waiting).")
+            self._jobs[job.id] = job
+        self._save(job)
+        return job
+
+    def get(self, job_id):
+        """Returns the job with this id, whichever process runs it, or None if it is unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self.db_path is None or not self.db_path.exists():
+            return job
+
+        row = self._connection().execute(
+            "SELECT state, heartbeat_at FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = Job.from_dict(json.loads(row[0]))
+        if job.status in ('queued', 'running') and time.time() - row[1] > 3 * self.heartbeat:
+            job.status = job.stage = 'failed'
+            job.error = 'The worker running this job stopped before it finished.'
+            job.finished_at = time.time()
+            self._save(job)
+        return job
+
+    def queued_count(self):
+        return self._queue.qsize()
+
+    def _prune(self):
+        threshold = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < threshold]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._saved_at.pop(job_id, None)
+        if self.db_path is not None and self.db_path.exists():
+            try:
+                self._connection().execute("DELETE FROM jobs WHERE finished_at < ?", (threshold,))
+            except sqlite3.Error as e:
+                logging.error(f"Error pruning finished jobs: {e}")
+
+    def _beat(self):
+        """Refreshes the heartbeat of this process's unfinished jobs, so other processes know they are alive."""
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                active = [(time.time(), job.id) for job in self._jobs.values() if not job.finished_at]
+            if not active:
+                continue
+            try:
+                self._connection().executemany("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?", active)
+            except sqlite3.Error as e:
+                logging.error(f"Error refreshing job heartbeats: {e}")
+
+    def _work(self):
+        while True:
+            job, func, args, kwargs = self._queue.get()
+            job.status = 'running'
+            job.started_at = time.time()
+            job.update(stage='running')
+            self._save(job)
+            try:
+                job.result = func(job, *args, **kwargs)
+                job.status = 'completed'
+                job.update(stage='completed')
+            except Exception as e:
+                logging.error(f"Job {job.id} ({job.kind}) failed: {e}")
+                job.error = str(e)
+                job.status = 'failed'
+                job.update(stage='failed')
+            finally:
+                job.finished_at = time.time()
+                self._save(job)
+                self._queue.task_done()
@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('podcast.metrics')
+
+
+class MetricsRegistry:
+    """
+    In-process counters and timings, rendered in the Prometheus text exposition format.
+    Timings are kept as summaries (count, sum and max of the observed seconds) per name and label set.
+    Collectors registered with register_collector() add values that are owned elsewhere, such as cache statistics.
+    """
+
+    def __init__(self, prefix='podcast'):
+        self.prefix = prefix
+        self._counters = {}
+        self._timings = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def incr(self, name, amount=1, **labels):
+        """Increments the counter `name` for the given labels."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        """Records one timing of `seconds` under `name` and logs it as a structured line."""
+        key = self._key(name, labels)
+        with self._lock:
+            count, total, maximum = self._timings.get(key, (0, 0.0, 0.0))
+            self._timings[key] = (count + 1, total + seconds, max(maximum, seconds))
+        label_text = ' '.join(f"{label}={value}" for label, value in key[1])
+        logger.debug(f"timing name={name} seconds={seconds:.4f} {label_text}".rstrip())
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Times the enclosed block, including blocks that raise."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register_collector(self, collector):
+        """Registers a callable returning (name, labels, value) samples that are read when rendering."""
+        self._collectors.append(collector)
+
+    def _format(self, name, labels, value):
+        label_text = ','.join(f'{label}="{str(label_value)}"' for label, label_value in labels)
+        return f"{self.prefix}_{name}{{{label_text}}} {value}" if label_text else f"{self.prefix}_{name} {value}"
+
+    def render_prometheus(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timings = sorted(self._timings.items())
+
+        lines = []
+        for (name, labels), value in counters:
+            lines.append(self._format(f"{name}_total", labels, value))
+        for (name, labels), (count, total, maximum) in timings:
+            lines.append(self._format(f"{name}_seconds_count", labels, count))
+            lines.append(self._format(f"{name}_seconds_sum", labels, round(total, 6)))
+            lines.append(self._format(f"{name}_seconds_max", labels, round(maximum, 6)))
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    lines.append(self._format(name, tuple(sorted(labels.items())), value))
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+# Shared registry for the application
+metrics = MetricsRegistry()
@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PyPDF2 import PdfReader
+
+# Documents shorter than this are extracted in-process; worker start-up would cost more than it saves
+PARALLEL_PAGE_THRESHOLD = 32
+# Pages handed to a worker process at a time
+PAGES_PER_TASK = 16
+# Size of the worker pool shared by all extractions in this process
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """
+    Returns the process pool, creating it on first use. Workers are spawned rather than forked:
+    the server process runs many threads, and forking a threaded process can deadlock the child.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forgets a broken pool (e.g. a worker was killed) so the next extraction starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Extracts pages [start, stop) in a worker process. Returns the page texts in order."""
+    reader = PdfReader(pdf_path)
+    return [reader.pages[n].extract_text() or '' for n in range(start, stop)]
+
+
+def iter_pdf_pages(pdf_path):
+    """
+    Yields the text of each page of the PDF in page order.
+    Large documents are split into page ranges that are extracted by the shared pool of worker processes;
+    pages are yielded as soon as their range and all earlier ranges are done. Concurrent extractions queue
+    their ranges on the same pool, so they never use more than PDF_EXTRACT_WORKERS processes together.
+    """
+    reader = PdfReader(pdf_path)
+    page_count = len(reader.pages)
+
+    if page_count < PARALLEL_PAGE_THRESHOLD or PDF_EXTRACT_WORKERS < 2:
+        for page in reader.pages:
+            yield page.extract_text() or ''
+        return
+
+    pool = _get_pool()
+    futures = []
+    try:
+        futures = [
+            pool.submit(_extract_page_range, str(pdf_path), start, min(start + PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PAGES_PER_TASK)
+        ]
+        for future in futures:
+            yield from future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # Drop pending ranges if the consumer stopped early
+        for future in futures:
+            future.cancel()
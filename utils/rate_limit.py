@@ -0,0 +1,161 @@
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Exponential backoff with full jitter: a random delay between 0 and min(cap, base * 2**attempt) seconds."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AdaptiveLimiter:
+    """
+    Limits concurrent requests to a rate-limited service and adapts the limit to its throttling (AIMD):
+    every successful request raises the limit by 1/limit (about one more slot per round of requests, up to
+    max_concurrency), and a throttled request halves it (down to min_concurrency). After a decrease, the limit
+    holds for decrease_cooldown seconds, so a burst of throttled requests counts as one signal.
+    With `rate`, request starts are also spaced by a token bucket of `rate` requests per second.
+
+    The limit and the slots in use (leases) live in a SQLite database, so all worker processes on the host
+    share one budget. Leases expire after lease_seconds, which frees the slots of processes that died.
+    """
+
+    def __init__(self, name, db_path, max_concurrency, min_concurrency=1, rate=None, burst=None,
+                 decrease_factor=0.5, decrease_cooldown=2.0, lease_seconds=300, poll_interval=0.05):
+        self.name = name
+        self.db_path = Path(db_path)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.rate = rate
+        self.burst = burst or max_concurrency
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS limiter_state (
+                    name TEXT PRIMARY KEY,
+                    concurrency REAL NOT NULL,
+                    decreased_at REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    refilled_at REAL NOT NULL
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS limiter_leases (
+                    lease_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._local.connection = connection
+        return connection
+
+    def _state(self, connection, now):
+        row = connection.execute(
+            "SELECT concurrency, decreased_at, tokens, refilled_at FROM limiter_state WHERE name = ?", (self.name,)
+        ).fetchone()
+        if row is None:
+            row = (float(self.max_concurrency), 0.0, float(self.burst), now)
+            connection.execute("INSERT INTO limiter_state VALUES (?, ?, ?, ?, ?)", (self.name, *row))
+        concurrency, decreased_at, tokens, refilled_at = row
+        # The configured bounds win over a limit stored by an earlier configuration
+        concurrency = min(self.max_concurrency, max(self.min_concurrency, concurrency))
+        return concurrency, decreased_at, tokens, refilled_at
+
+    def _try_acquire(self):
+        """Takes a slot if one is free. Returns (lease_id, None) or (None, seconds to wait before trying again)."""
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM limiter_leases WHERE name = ? AND expires_at < ?", (self.name, now))
+            concurrency, _, tokens, refilled_at = self._state(connection, now)
+            in_use = connection.execute("SELECT COUNT(*) FROM limiter_leases WHERE name = ?", (self.name,)).fetchone()[0]
+            if in_use >= int(concurrency):
+                return None, self.poll_interval
+
+            if self.rate:
+                tokens = min(self.burst, tokens + (now - refilled_at) * self.rate)
+                if tokens < 1:
+                    return None, max(self.poll_interval, (1 - tokens) / self.rate)
+                tokens -= 1
+
+            lease_id = uuid.uuid4().hex
+            connection.execute("INSERT INTO limiter_leases VALUES (?, ?, ?)", (lease_id, self.name, now + self.lease_seconds))
+            connection.execute("UPDATE limiter_state SET tokens = ?, refilled_at = ? WHERE name = ?", (tokens, now, self.name))
+            return lease_id, None
+
+    def acquire(self):
+        """Waits for a free slot and returns its lease id."""
+        while True:
+            lease_id, wait = self._try_acquire()
+            if lease_id:
+                return lease_id
+            # Jitter keeps waiting workers from polling in lockstep
+            time.sleep(wait * random.uniform(0.5, 1.5))
+
+    def release(self, lease_id, outcome='success'):
+        """
+        Frees a slot and adapts the limit to the outcome of its request:
+        'success' increases it, 'throttled' decreases it and 'error' leaves it unchanged.
+        """
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM limiter_leases WHERE lease_id = ?", (lease_id,))
+            concurrency, decreased_at, _, _ = self._state(connection, now)
+            if outcome == 'success' and now - decreased_at >= self.decrease_cooldown:
+                concurrency = min(self.max_concurrency, concurrency + 1 / concurrency)
+            elif outcome == 'throttled' and now - decreased_at >= self.decrease_cooldown:
+                concurrency = max(self.min_concurrency, concurrency * self.decrease_factor)
+                decreased_at = now
+            connection.execute("UPDATE limiter_state SET concurrency = ?, decreased_at = ? WHERE name = ?",
+                               (concurrency, decreased_at, self.name))
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds a slot for the enclosed request. The block sets `outcome` on the yielded object to 'throttled'
+        or 'error' when the request did not succeed; an exception counts as an error.
+        """
+        lease = _Lease(self.acquire())
+        try:
+            yield lease
+        except BaseException:
+            lease.outcome = 'error'
+            raise
+        finally:
+            self.release(lease.id, lease.outcome)
+
+    def stats(self):
+        """Returns the current limit and the number of slots in use."""
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            concurrency = self._state(connection, now)[0]
+            in_use = connection.execute(
+                "SELECT COUNT(*) FROM limiter_leases WHERE name = ? AND expires_at >= ?", (self.name, now)
+            ).fetchone()[0]
+        return {'concurrency': round(concurrency, 3), 'in_use': in_use, 'max_concurrency': self.max_concurrency}
+
+
+class _Lease:
+    def __init__(self, lease_id):
+        self.id = lease_id
+        self.outcome = 'success'
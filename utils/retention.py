@@ -0,0 +1,199 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils.metrics import metrics
+
+
+class RetentionPolicy:
+    """
+    Which generated files of one kind to keep: the entries matching `pattern` in `directory` are removed once
+    unused for `max_age` seconds, and the least recently used ones are removed while the class takes more than
+    `max_bytes`. Entries used within the last `min_age` seconds are always kept, since another worker may
+    still be writing or serving them. None disables a limit.
+    """
+
+    def __init__(self, name, directory, pattern, max_age=None, max_bytes=None, min_age=600):
+        self.name = name
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+
+
+def _entry_usage(path):
+    """Returns (size in bytes, last use time) of a file or directory; a directory counts its newest file."""
+    stat = path.stat()
+    # The access time is set explicitly by touch(), so it is meaningful even on relatime/noatime mounts
+    last_used = max(stat.st_mtime, stat.st_atime)
+    if not path.is_dir():
+        return stat.st_size, last_used
+
+    size = 0
+    for child in path.rglob('*'):
+        try:
+            child_stat = child.stat()
+        except OSError:
+            continue
+        if child.is_file():
+            size += child_stat.st_size
+        last_used = max(last_used, child_stat.st_mtime)
+    return size, last_used
+
+
+def _remove(path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+class RetentionManager:
+    """
+    Applies retention policies to the generated files on disk, from a background thread or on demand.
+    Entries are removed least recently used first. Paths registered with hold() or in_use() are never removed,
+    so a running job keeps its inputs and outputs; files of other processes are protected by the policies' min_age.
+    """
+
+    def __init__(self, policies):
+        self.policies = policies
+        self.sweepers = {}  # name -> cleanup of data that is not stored as files, see register_sweeper()
+        self.last_sweep = {}  # policy name -> report of the latest sweep
+        self._in_use = {}  # resolved path -> number of holders
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def register_sweeper(self, name, sweep):
+        """
+        Adds a cleanup of data that is not stored as files, e.g. database rows. `sweep(max_age)` is called on
+        every sweep with the max_age override (None for its own limit) and returns a report like the policies'.
+        """
+        self.sweepers[name] = sweep
+
+    def hold(self, path):
+        """Protects a file or directory from removal until a matching release()."""
+        key = Path(path).resolve()
+        with self._lock:
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+
+    def release(self, path):
+        key = Path(path).resolve()
+        with self._lock:
+            self._in_use[key] -= 1
+            if not self._in_use[key]:
+                del self._in_use[key]
+
+    @contextmanager
+    def in_use(self, path):
+        """Protects a file or directory from removal while the enclosed block runs."""
+        self.hold(path)
+        try:
+            yield
+        finally:
+            self.release(path)
+
+    def _is_in_use(self, path):
+        key = path.resolve()
+        with self._lock:
+            return any(key == held or held.is_relative_to(key) or key.is_relative_to(held) for held in self._in_use)
+
+    @staticmethod
+    def touch(path):
+        """Records an access to a file, e.g. a download, so size-based eviction keeps it longer."""
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def _apply(self, policy, now, max_age):
+        entries = []
+        for path in policy.directory.glob(policy.pattern):
+            try:
+                size, last_used = _entry_usage(path)
+            except OSError:
+                continue  # Removed meanwhile
+            entries.append((last_used, path, size))
+        entries.sort(key=lambda entry: entry[0])
+
+        total_bytes = sum(size for _, _, size in entries)
+        removed_files = removed_bytes = 0
+        for last_used, path, size in entries:
+            age = now - last_used
+            expired = max_age is not None and age > max_age
+            over_quota = policy.max_bytes is not None and total_bytes > policy.max_bytes
+            if not (expired or over_quota):
+                # Entries are ordered by last use, so later ones are neither older nor needed for the quota
+                break
+            if age < policy.min_age or self._is_in_use(path):
+                continue
+            try:
+                _remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"Error removing {path}: {e}")
+                continue
+            total_bytes -= size
+            removed_files += 1
+            removed_bytes += size
+            logging.info(f"Retention ({policy.name}): removed {path} ({size} bytes, unused for {age / 3600:.1f} h)")
+
+        metrics.incr('retention_removed_files', removed_files, artifact=policy.name)
+        metrics.incr('retention_reclaimed_bytes', removed_bytes, artifact=policy.name)
+        return {'removed_files': removed_files, 'reclaimed_bytes': removed_bytes,
+                'remaining_files': len(entries) - removed_files, 'remaining_bytes': total_bytes}
+
+    def sweep(self, max_age=None):
+        """
+        Applies every policy once. `max_age` (seconds) overrides the policies' own max_age.
+        Returns {policy name: {'removed_files', 'reclaimed_bytes', 'remaining_files', 'remaining_bytes'}}.
+        """
+        now = time.time()
+        report = {}
+        with metrics.timed('retention_sweep'):
+            for policy in self.policies:
+                try:
+                    report[policy.name] = self._apply(policy, now, policy.max_age if max_age is None else max_age)
+                except Exception as e:
+                    logging.error(f"Error applying the {policy.name} retention policy: {e}")
+            for name, sweeper in list(self.sweepers.items()):
+                try:
+                    result = sweeper(max_age)
+                except Exception as e:
+                    logging.error(f"Error applying the {name} retention sweeper: {e}")
+                    continue
+                metrics.incr('retention_removed_files', result['removed_files'], artifact=name)
+                metrics.incr('retention_reclaimed_bytes', result['reclaimed_bytes'], artifact=name)
+                report[name] = result
+        self.last_sweep = report
+        reclaimed = sum(result['reclaimed_bytes'] for result in report.values())
+        if reclaimed:
+            logging.info(f"Retention sweep reclaimed {reclaimed} bytes")
+        return report
+
+    def start(self, interval):
+        """Sweeps every `interval` seconds in a daemon thread, starting one interval from now."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='retention', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def collect_metrics(self):
+        """Reports the disk usage of each artifact class as of the latest sweep."""
+        for name, result in self.last_sweep.items():
+            yield 'retention_bytes', {'artifact': name}, result['remaining_bytes']
+            yield 'retention_files', {'artifact': name}, result['remaining_files']
@@ -0,0 +1,32 @@
+import threading
+
+
+class LazySessionInterface:
+    """
+    Installs the Flask-Session backend configured with SESSION_TYPE on the first request instead of at import,
+    so starting a worker does not create the session store. The cookie then only carries the session id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+
+    def _interface(self):
+        with self._lock:
+            if self.app.session_interface is self:
+                from flask_session import Session
+                Session(self.app)  # Replaces app.session_interface with the configured backend
+            return self.app.session_interface
+
+    def __getattr__(self, name):
+        return getattr(self._interface(), name)
+
+
+def init_server_sessions(app):
+    """
+    Stores sessions on the server with Flask-Session according to the app's SESSION_* settings.
+    SESSION_TYPE 'cookie' keeps Flask's signed cookie sessions, which suits a single local user.
+    """
+    if app.config.get('SESSION_TYPE', 'cookie') == 'cookie':
+        return
+    app.session_interface = LazySessionInterface(app)
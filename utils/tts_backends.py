@@ -0,0 +1,288 @@
+import hashlib
+import math
+import os
+import re
+import struct
+import threading
+import time
+
+from utils.audio import build_wav
+from utils.metrics import metrics
+
+
+class SynthesisResult:
+    """
+    Outcome of one synthesis request.
+    audio_data is a WAV payload (header and PCM data); bookmarks maps SSML bookmark names to their
+    audio offsets in 100-nanosecond ticks. On failure audio_data is None and error describes it;
+    throttled marks failures that are worth retrying after a backoff.
+    """
+
+    def __init__(self, audio_data=None, bookmarks=None, error=None, throttled=False):
+        self.audio_data = audio_data
+        self.bookmarks = bookmarks or {}
+        self.error = error
+        self.throttled = throttled
+
+
+class PooledSynthesizer:
+    """A SpeechSynthesizer with its pre-opened service connection and the voice it last spoke."""
+
+    def __init__(self, synthesizer, connection):
+        self.synthesizer = synthesizer
+        self.connection = connection
+        self.voice = None
+        self.connected = False
+        self.last_used = time.monotonic()
+
+
+class SynthesizerPool:
+    """
+    Long-lived SpeechSynthesizers with pre-opened connections, so requests skip the connection and TLS setup.
+    A synthesizer serves one request at a time: acquire() checks one out, preferring one that last spoke the
+    same voice, and release() returns it. Synthesizers whose connection dropped are reconnected on checkout,
+    and those that failed a request are closed and replaced.
+    """
+
+    def __init__(self, sdk, speech_config, max_size=5, max_idle_seconds=240):
+        self.sdk = sdk
+        self.speech_config = speech_config
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds  # The service drops idle connections after a few minutes
+        self._idle = []  # Most recently used last
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def _create(self):
+        synthesizer = self.sdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+        connection = self.sdk.Connection.from_speech_synthesizer(synthesizer)
+        entry = PooledSynthesizer(synthesizer, connection)
+
+        def on_connected(evt):
+            entry.connected = True
+
+        def on_disconnected(evt):
+            entry.connected = False
+
+        connection.connected.connect(on_connected)
+        connection.disconnected.connect(on_disconnected)
+        self._open(entry)
+        return entry
+
+    @staticmethod
+    def _open(entry):
+        entry.connection.open(True)
+        entry.connected = True
+
+    def _healthy(self, entry):
+        return entry.connected and time.monotonic() - entry.last_used < self.max_idle_seconds
+
+    def acquire(self, voice=None):
+        """Checks out a synthesizer with an open connection, waiting if the pool is exhausted."""
+        with self._condition:
+            while True:
+                if self._idle:
+                    # Voice affinity first, then the most recently used synthesizer (the most likely to still be connected)
+                    matches = [entry for entry in self._idle if entry.voice == voice]
+                    entry = matches[-1] if matches else self._idle[-1]
+                    self._idle.remove(entry)
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    entry = None
+                    break
+                self._condition.wait()
+
+        try:
+            if entry is None:
+                entry = self._create()
+                metrics.incr('tts_pool_connections', event='opened')
+            elif not self._healthy(entry):
+                self._open(entry)
+                metrics.incr('tts_pool_connections', event='reopened')
+            else:
+                metrics.incr('tts_pool_connections', event='reused')
+        except Exception:
+            self._discard(entry)
+            raise
+        entry.voice = voice
+        return entry
+
+    def release(self, entry, healthy=True):
+        """Returns a synthesizer to the pool, or closes it if it is no longer healthy."""
+        if not healthy:
+            self._discard(entry)
+            return
+        entry.last_used = time.monotonic()
+        with self._condition:
+            self._idle.append(entry)
+            self._condition.notify()
+
+    def _discard(self, entry):
+        if entry is not None:
+            metrics.incr('tts_pool_connections', event='discarded')
+            try:
+                entry.connection.close()
+            except Exception as e:
+                print(f"Error closing speech synthesizer connection: {e}")
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def prewarm(self, count):
+        """Opens up to `count` connections ahead of the first request."""
+        entries = []
+        try:
+            for _ in range(min(count, self.max_size)):
+                entries.append(self.acquire())
+        except Exception as e:
+            print(f"Error pre-warming speech synthesizer connections: {e}")
+        for entry in entries:
+            entry.voice = None
+            self.release(entry)
+
+    def stats(self):
+        with self._condition:
+            return {'size': self._size, 'idle': len(self._idle), 'max_size': self.max_size}
+
+
+class AzureTTSBackend:
+    """
+    Synthesizes SSML with Azure Speech, using a pool of synthesizers with pre-opened connections.
+    `prewarm` connections are opened in the background when the backend is created.
+    """
+
+    name = 'azure'
+    # Applied to the speech config; the audio pipeline splits and joins RIFF PCM
+    output_format = 'Riff24Khz16BitMonoPcm'
+    # The service rejects SSML documents with more <voice> elements than this
+    max_voice_elements = 50
+
+    def __init__(self, speech_config, pool_size=5, prewarm=1):
+        # The Speech SDK loads a large native library, so it is only imported when Azure is actually used
+        import azure.cognitiveservices.speech as speechsdk
+
+        self.sdk = speechsdk
+        self.speech_config = speech_config
+        speech_config.set_speech_synthesis_output_format(getattr(speechsdk.SpeechSynthesisOutputFormat, self.output_format))
+        self.pool = SynthesizerPool(speechsdk, speech_config, max_size=pool_size)
+        if prewarm:
+            threading.Thread(target=self.pool.prewarm, args=(prewarm,), name='tts-pool-prewarm', daemon=True).start()
+
+    def synthesize(self, ssml):
+        # Requests for the same voice go to the synthesizer that spoke it last
+        voice = re.search(r"<voice name='([^']*)'", ssml)
+        entry = self.pool.acquire(voice.group(1) if voice else None)
+        synthesizer = entry.synthesizer
+        bookmarks = {}
+
+        def on_bookmark(evt):
+            bookmarks[evt.text] = evt.audio_offset
+
+        healthy = False
+        synthesizer.bookmark_reached.connect(on_bookmark)
+        try:
+            result = synthesizer.speak_ssml_async(ssml).get()
+            healthy = True
+        finally:
+            synthesizer.bookmark_reached.disconnect_all()
+            if not healthy:
+                self.pool.release(entry, healthy=False)
+
+        if result.reason == self.sdk.ResultReason.SynthesizingAudioCompleted:
+            self.pool.release(entry)
+            return SynthesisResult(result.audio_data, bookmarks)
+
+        cancellation_details = result.cancellation_details
+        if cancellation_details.reason == self.sdk.CancellationReason.Error and cancellation_details.error_details:
+            error_details = cancellation_details.error_details
+            throttled = "Error code: 4429" in error_details
+            # A throttled request leaves the connection usable; other errors may come from a broken one
+            self.pool.release(entry, healthy=throttled)
+            return SynthesisResult(error=error_details, throttled=throttled)
+        self.pool.release(entry)
+        return SynthesisResult(error=f"Cancellation reason: {cancellation_details.reason}")
+
+
+class LocalTTSBackend:
+    """
+    Deterministic offline stand-in for Azure Speech, for load tests and benchmarks.
+    Each voice speaks a fixed tone (derived from its name) for a duration proportional to the text,
+    after a simulated latency of `latency` seconds plus `char_latency` per character.
+    With max_concurrency, requests beyond that many in flight fail as throttled, like error 4429.
+    """
+
+    name = 'local'
+    output_format = 'Riff24Khz16BitMonoPcm'  # What the tones are rendered as, named like Azure's formats
+    max_voice_elements = 50  # Azure's limit, so batches are packed as they would be for the service
+    frame_rate = 24000
+    seconds_per_char = 0.06
+    pause_seconds = 0.15
+    tones = (150, 200, 240, 300, 400)  # Divisors of the frame rate, so one period is a whole number of frames
+
+    def __init__(self, latency=0.2, char_latency=0.002, max_concurrency=None):
+        self.latency = latency
+        self.char_latency = char_latency
+        self.max_concurrency = max_concurrency
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _tone(self, voice, frames):
+        frequency = self.tones[int(hashlib.sha256(voice.encode('utf-8')).hexdigest(), 16) % len(self.tones)]
+        period = self.frame_rate // frequency
+        cycle = b''.join(
+            struct.pack('<h', int(8000 * math.sin(2 * math.pi * n / period)))
+            for n in range(period)
+        )
+        return (cycle * (frames // period + 1))[:frames * 2]
+
+    def synthesize(self, ssml):
+        with self._lock:
+            if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                return SynthesisResult(error="Error code: 4429. Too many requests (local engine).", throttled=True)
+            self._in_flight += 1
+
+        try:
+            pcm = []
+            bookmarks = {}
+            frames = 0
+            characters = 0
+            for voice, body in re.findall(r"<voice name='([^']*)'>(.*?)</voice>", ssml, re.S):
+                for mark in re.findall(r"<bookmark mark='([^']*)'/>", body):
+                    bookmarks[mark] = frames * 10_000_000 // self.frame_rate
+                text = ' '.join(re.sub(r'<[^>]+>', ' ', body).split())
+                characters += len(text)
+                speech_frames = int(len(text) * self.seconds_per_char * self.frame_rate)
+                pause_frames = int(self.pause_seconds * self.frame_rate)
+                pcm.append(self._tone(voice, speech_frames))
+                pcm.append(b'\x00\x00' * pause_frames)
+                frames += speech_frames + pause_frames
+
+            time.sleep(self.latency + self.char_latency * characters)
+            return SynthesisResult(build_wav((1, 2, self.frame_rate), b''.join(pcm)), bookmarks)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def create_tts_backend(get_speech_config):
+    """
+    Creates the backend selected by the TTS_BACKEND environment variable ('azure' or 'local').
+    get_speech_config is only called for the Azure backend; returns None if it provides no speech config.
+    """
+    backend_name = os.getenv('TTS_BACKEND', 'azure').lower()
+    if backend_name == 'local':
+        max_concurrency = os.getenv('LOCAL_TTS_MAX_CONCURRENCY')
+        return LocalTTSBackend(
+            latency=float(os.getenv('LOCAL_TTS_LATENCY', 0.2)),
+            char_latency=float(os.getenv('LOCAL_TTS_CHAR_LATENCY', 0.002)),
+            max_concurrency=int(max_concurrency) if max_concurrency else None
+        )
+    if backend_name != 'azure':
+        raise ValueError(f"Unknown TTS backend: {backend_name}")
+    speech_config = get_speech_config()
+    if not speech_config:
+        return None
+    return AzureTTSBackend(speech_config,
+                           pool_size=int(os.getenv('AZURE_TTS_POOL_SIZE', 5)),
+                           prewarm=int(os.getenv('AZURE_TTS_PREWARM', 1)))
@@ -1,63 +1,86 @@
 import os
+import math
 import json
 import re
 import uuid
+import hashlib
 import requests
 from bs4 import BeautifulSoup
-from PyPDF2 import PdfReader
-import shutil
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
-from pydub import AudioSegment
-import os
-import openai
 import time
-import azure.cognitiveservices.speech as speechsdk
-from azure.ai.documentintelligence.models import AnalyzeResult
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-import azure.cognitiveservices.speech as speechsdk
-
-# Constants for file paths
-EXTRACTED_TEXT_FILE = Path('text_files') / 'extracted_text.txt'
-CONVERSATION_FILE = Path('text_files') / 'conversation.txt'
-
-# Set up OpenAI authentication once in utils.py
-openai.api_type = "azure"
-openai.api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
-openai.api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-openai.api_key = os.getenv("AZURE_OPENAI_API_KEY")
-MODEL_NAME = os.getenv("AZURE_OPENAI_MODEL_NAME")
-
-# Initialize Azure Document Intelligence client
-try:
-    document_intelligence_client = DocumentIntelligenceClient(
-        endpoint=os.getenv("DOCUMENTINTELLIGENCE_ENDPOINT"),
-        credential=AzureKeyCredential(os.getenv("DOCUMENTINTELLIGENCE_API_KEY"))
-    )
-    if not os.getenv("DOCUMENTINTELLIGENCE_ENDPOINT") or not os.getenv("DOCUMENTINTELLIGENCE_API_KEY"):
-        raise ValueError("Azure Document Intelligence configuration is incomplete.")
-except Exception as e:
-    print(f"Error initializing Azure Document Intelligence client: {e}")
-    document_intelligence_client = None
-
-# Initialize Azure Speech Service config
-try:
-    speech_config = speechsdk.SpeechConfig(subscription=os.getenv("SPEECH_KEY_NEW"), region="swedencentral") #
-    speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config)
+import threading
+import queue
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from utils.audio import (build_wav, encode_stream, open_audio_writer, resolve_output_format, split_pcm_at_offsets,
+                         split_wav, OUTPUT_FORMATS)
+from utils.disk_cache import DiskCache
+from utils.fetch import HTTPFetcher, default_html_parser
+from utils.pdf_extract import iter_pdf_pages
+from utils.rate_limit import AdaptiveLimiter, backoff_delay
+from utils.retention import RetentionManager, RetentionPolicy
+from utils.clients import get_document_intelligence_client, get_openai, get_openai_model, get_tts_backend, lazy_client
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Service rate limits are shared by all worker processes on the host through the RATE_LIMIT_DB database.
+# The limiters are created on first use, so their settings are read after the app has loaded its .env file.
+def _rate_limit_db():
+    return Path(os.getenv('RATE_LIMIT_DB', 'cache/rate_limits.db'))
+
+@lazy_client
+def get_openai_limiter():
+    """Returns the limiter shared by all OpenAI requests (MAX_CONCURRENT_LLM_REQUESTS at most)."""
+    return AdaptiveLimiter('openai', _rate_limit_db(), max_concurrency=int(os.getenv('MAX_CONCURRENT_LLM_REQUESTS', 8)))
+
+def _is_rate_limited(error):
+    return getattr(error, 'status_code', None) == 429
+
+def _release_after_stream(response, lease_id):
+    outcome = 'error'
+    try:
+        yield from response
+        outcome = 'success'
+    finally:
+        # Also runs when the consumer stops reading early
+        get_openai_limiter().release(lease_id, outcome)
 
-except Exception as e:
-    print(f"Error initializing Azure Speech Service config: {e}")
-    speech_config = None
+def create_chat_completion(max_retries=3, **kwargs):
+    """
+    Creates an OpenAI chat completion within the shared OpenAI rate limit.
+    Rate-limited requests (HTTP 429) give up their slot and are retried after a jittered exponential backoff.
+    Streamed completions keep their slot until the stream has been read.
+    """
+    limiter = get_openai_limiter()
+    for attempt in range(max_retries + 1):
+        lease_id = limiter.acquire()
+        try:
+            response = get_openai().chat.completions.create(**kwargs)
+        except Exception as e:
+            if not _is_rate_limited(e):
+                limiter.release(lease_id, 'error')
+                raise
+            limiter.release(lease_id, 'throttled')
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            metrics.incr('llm_retries', reason='throttled')
+            logger.warning(f"OpenAI request rate limited. Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+            continue
 
-if not all([openai.api_base, openai.api_version, openai.api_key, MODEL_NAME]):
-    raise ValueError("Azure OpenAI configuration is incomplete.")
+        if kwargs.get('stream'):
+            return _release_after_stream(response, lease_id)
+        limiter.release(lease_id, 'success')
+        return response
 
-def generate_conversation(text_content, process_id):
-    """Generates a conversation using OpenAI's chat completion."""
-    conversation_file = f"static/conversations/conversation_{process_id}.txt"
-    prompt = f"""
+def build_conversation_prompt(text_content):
+    """Builds the prompt asking the model for a two-speaker podcast script about text_content."""
+    return f"""
     Generate a podcast conversation between two speakers discussing the following content:
     {text_content}
 
@@ -75,14 +98,31 @@ def generate_conversation(text_content, process_id):
     Ensure the total length is within 15000 tokens.
     """
 
+def save_conversation(conversation, process_id):
+    """Saves a generated conversation under static/conversations. Returns False if it could not be written."""
+    conversation_file = f"static/conversations/conversation_{process_id}.txt"
     try:
-        response = openai.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": "You are a podcast script generator."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        with open(conversation_file, "w", encoding='utf-8') as f:
+            f.write(conversation)
+        print(f"Conversation saved to {conversation_file}")
+        return True
+    except Exception as e:
+        print(f"Failed to save conversation file: {e}")
+        return False
+
+def generate_conversation(text_content, process_id):
+    """Generates a conversation using OpenAI's chat completion."""
+    prompt = build_conversation_prompt(text_content)
+
+    try:
+        with metrics.timed('llm_request', purpose='conversation'):
+            response = create_chat_completion(
+                model=get_openai_model(),
+                messages=[
+                    {"role": "system", "content": "You are a podcast script generator."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         conversation = response.choices[0].message.content.strip()
         print("Conversation generated by OpenAI.")
     except Exception as e:
@@ -90,36 +130,184 @@ def generate_conversation(text_content, process_id):
         return None
 
     # Save conversation to file with timestamp
-    try:
-        with open(conversation_file, "w", encoding='utf-8') as f:
-            f.write(conversation)
-        print(f"Conversation saved to {conversation_file}")
-    except Exception as e:
-        print(f"Failed to save conversation file: {e}")
+    if not save_conversation(conversation, process_id):
         return None
 
     return conversation
 
+def iter_completed_lines(text_chunks):
+    """Reassembles streamed text chunks and yields each line as soon as its newline arrives."""
+    buffer = ''
+    for chunk in text_chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        yield from lines
+    if buffer:
+        yield buffer
+
+def iter_stream_deltas(response):
+    """Yields the text deltas of a streamed chat completion."""
+    for chunk in response:
+        # Azure sends chunks without choices (e.g. content filter results)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def generate_conversation_stream(text_content, process_id):
+    """
+    Generates a conversation like generate_conversation, but streams the completion.
+    Yields each line of the script as soon as it is complete, so turns can be synthesized
+    while the rest of the script is still being written. The full script is saved at the end.
+    """
+    prompt = build_conversation_prompt(text_content)
+
+    lines = []
+    start = time.perf_counter()
+    try:
+        response = create_chat_completion(
+            model=get_openai_model(),
+            messages=[
+                {"role": "system", "content": "You are a podcast script generator."},
+                {"role": "user", "content": prompt}
+            ],
+            stream=True
+        )
+        for line in iter_completed_lines(iter_stream_deltas(response)):
+            if not lines:
+                metrics.observe('llm_first_line', time.perf_counter() - start, purpose='conversation_stream')
+            lines.append(line)
+            yield line
+        metrics.observe('llm_request', time.perf_counter() - start, purpose='conversation_stream')
+        print("Conversation streamed by OpenAI.")
+    except Exception as e:
+        print(f"OpenAI API error: {e}")
+        return
+
+    save_conversation('\n'.join(lines).strip(), process_id)
+
+# Long inputs are condensed with a map-reduce summarization before the script is generated
+MAX_OUTLINE_TEXT_LENGTH = 15000  # Characters passed to generate_conversation
+SUMMARY_CHUNK_TOKENS = 3000  # Input tokens per summarization request
+CHARS_PER_TOKEN = 4  # Rough estimate for English text
+MAX_CONCURRENT_SUMMARIES = 4
+MAX_SUMMARY_ROUNDS = 3
+
+def split_text_into_chunks(text, max_chars):
+    """
+    Yields consecutive chunks of text of at most max_chars characters.
+    Chunks end on a paragraph break where possible, then on a line break, then after a sentence.
+    """
+    start = 0
+    while start < len(text):
+        end = start + max_chars
+        if end < len(text):
+            for separator in ('\n\n', '\n', '. '):
+                boundary = text.rfind(separator, start + max_chars // 2, end)
+                if boundary != -1:
+                    end = boundary + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            yield chunk
+        start = end
+
+def summarize_chunk(chunk, target_chars):
+    """Summarizes one chunk of a long document in roughly target_chars characters."""
+    prompt = f"""
+    Summarize the following part of a longer document in at most {target_chars} characters.
+    Keep the key facts, figures, arguments and conclusions. Do not add an introduction.
+
+    {chunk}
+    """
+
+    try:
+        with metrics.timed('llm_request', purpose='summary'):
+            response = create_chat_completion(
+                model=get_openai_model(),
+                messages=[
+                    {"role": "system", "content": "You are a precise summarizer."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max(64, target_chars * 3 // (CHARS_PER_TOKEN * 2))
+            )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        metrics.incr('llm_errors', purpose='summary')
+        print(f"OpenAI API error while summarizing chunk: {e}")
+        # Keep the start of the chunk rather than losing it entirely
+        return chunk[:target_chars]
+
+def _summarize_round(text, max_chars, concurrency):
+    """Runs one map stage over text. At most `concurrency` chunks are in flight, so memory stays bounded."""
+    chunk_chars = SUMMARY_CHUNK_TOKENS * CHARS_PER_TOKEN
+    chunk_count = max(1, -(-len(text) // chunk_chars))
+    target_chars = max(500, max_chars // chunk_count)
+
+    summaries = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = deque()
+        for chunk in split_text_into_chunks(text, chunk_chars):
+            if len(in_flight) >= concurrency:
+                summaries.append(in_flight.popleft().result())
+            in_flight.append(executor.submit(summarize_chunk, chunk, target_chars))
+        summaries.extend(future.result() for future in in_flight)
+    return '\n\n'.join(summaries), len(summaries)
+
+def condense_text(text_content, max_chars=MAX_OUTLINE_TEXT_LENGTH, concurrency=MAX_CONCURRENT_SUMMARIES):
+    """
+    Condenses text_content to at most max_chars characters for script generation.
+    Short texts are returned unchanged. Longer texts are split on paragraph boundaries, the chunks are
+    summarized concurrently and the merged digest is summarized again until it fits.
+    Returns (digest, timings) where timings reports seconds and chunk counts per stage.
+    """
+    timings = {'input_chars': len(text_content), 'rounds': []}
+    start = time.perf_counter()
+
+    digest = text_content
+    while len(digest) > max_chars and len(timings['rounds']) < MAX_SUMMARY_ROUNDS:
+        round_start = time.perf_counter()
+        digest, chunk_count = _summarize_round(digest, max_chars, concurrency)
+        timings['rounds'].append({
+            'chunks': chunk_count,
+            'output_chars': len(digest),
+            'seconds': round(time.perf_counter() - round_start, 3)
+        })
+        print(f"Summarization round {len(timings['rounds'])}: {chunk_count} chunks condensed to {len(digest)} characters.")
+
+    if len(digest) > max_chars:
+        print(f"Digest still exceeds {max_chars} characters after {MAX_SUMMARY_ROUNDS} rounds. Truncating.")
+        digest = digest[:max_chars]
+
+    timings['output_chars'] = len(digest)
+    timings['seconds'] = round(time.perf_counter() - start, 3)
+    if timings['rounds']:
+        metrics.observe('condense', timings['seconds'])
+    return digest, timings
+
 def extract_text_from_pdf(pdf_path):
+    document_intelligence_client = get_document_intelligence_client()
     if not document_intelligence_client:
         print("Document Intelligence client is not initialized.")
         return ''
 
     print("Extracting text with Azure Document Intelligence")
     try:
-        with open(pdf_path, "rb") as f:
-            poller = document_intelligence_client.begin_analyze_document(
-                "prebuilt-layout", analyze_request=f, content_type="application/octet-stream"
-            )
-        result: AnalyzeResult = poller.result()
-        # operation_id = poller.details["operation_id"]
-
-        extracted_text = ''
-
-        for page in result.pages:
-            for line in page.lines:
-                print(line.content)
-                extracted_text += line.content + ' '
+        with metrics.timed('pdf_extraction', method='azure'):
+            with open(pdf_path, "rb") as f:
+                poller = document_intelligence_client.begin_analyze_document(
+                    "prebuilt-layout", analyze_request=f, content_type="application/octet-stream"
+                )
+            result = poller.result()
+            # operation_id = poller.details["operation_id"]
+
+            if result.paragraphs:
+                # One paragraph per block, so later steps (e.g. deduplication) see the document structure.
+                # Running headers, footers and page numbers are layout, not content.
+                extracted_text = '\n\n'.join(
+                    paragraph.content for paragraph in result.paragraphs
+                    if paragraph.role not in ('pageHeader', 'pageFooter', 'pageNumber')
+                )
+            else:
+                extracted_text = ' '.join(line.content for page in result.pages for line in page.lines)
 
         print("Text extracted from PDF successfully.")
         return extracted_text.strip()
@@ -132,10 +320,10 @@ def extract_text_from_pdf(pdf_path):
 def extract_text_from_pdf_pypdf2(pdf_path):
     """Extracts text from a PDF file using PyPDF2 as a fallback method."""
     try:
-        reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
+        # Pages are extracted in parallel for large documents and joined once at the end;
+        # a blank line between pages keeps a paragraph break where a page ends
+        with metrics.timed('pdf_extraction', method='pypdf2'):
+            text = '\n\n'.join(iter_pdf_pages(pdf_path))
         print("Text extracted from PDF successfully using PyPDF2.")
         return text.strip()
     except Exception as e:
@@ -143,45 +331,213 @@ def extract_text_from_pdf_pypdf2(pdf_path):
         return ''
     
 
+# Extracted text of uploaded PDFs, keyed by the SHA-256 of the file and the extraction method
+EXTRACTION_CACHE_DIR = Path('cache') / 'extracted_text'
+
+@lazy_client
+def get_extraction_cache():
+    """Returns the cache of extracted PDF text, limited to EXTRACTION_CACHE_MAX_BYTES (read on first use)."""
+    return DiskCache(EXTRACTION_CACHE_DIR, int(os.getenv('EXTRACTION_CACHE_MAX_BYTES', 256 * 1024 * 1024)), suffix='.txt')
+
+def collect_cache_metrics():
+    """Reports the TTS and extraction cache statistics as metric samples."""
+    for cache_name, cache in (('tts', get_tts_cache()), ('extraction', get_extraction_cache()), ('http', http_fetcher.cache)):
+        stats = cache.stats()
+        yield 'cache_hits_total', {'cache': cache_name}, stats['hits']
+        yield 'cache_misses_total', {'cache': cache_name}, stats['misses']
+        yield 'cache_evictions_total', {'cache': cache_name}, stats['evictions']
+        yield 'cache_bytes', {'cache': cache_name}, stats['bytes']
+
+metrics.register_collector(collect_cache_metrics)
+
+def collect_rate_limit_metrics():
+    """Reports the adaptive concurrency limits and the slots in use."""
+    for limiter in (get_tts_limiter(), get_openai_limiter()):
+        stats = limiter.stats()
+        yield 'rate_limit_concurrency', {'limiter': limiter.name}, stats['concurrency']
+        yield 'rate_limit_in_use', {'limiter': limiter.name}, stats['in_use']
+
+metrics.register_collector(collect_rate_limit_metrics)
+
+def hash_file_stream(stream, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a binary stream and rewinds it for later reads."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def _pdf_extraction_cache_key(content_hash, use_azure):
+    return DiskCache.make_key('pdf', content_hash, 'azure' if use_azure else 'pypdf2')
+
+def get_cached_pdf_text(content_hash, use_azure):
+    """Returns previously extracted text for a PDF with this content hash and method, or None."""
+    cached_text = get_extraction_cache().get(_pdf_extraction_cache_key(content_hash, use_azure))
+    return cached_text.decode('utf-8') if cached_text is not None else None
+
+def extract_pdf_text(pdf_path, use_azure, content_hash=None):
+    """
+    Extracts text with Azure Document Intelligence or PyPDF2. Returns (text, method_used).
+    If content_hash is given, successful extractions are added to the extraction cache.
+    """
+    with get_retention().in_use(pdf_path):
+        if use_azure:
+            text_content = extract_text_from_pdf(pdf_path)
+            method_used = 'Azure Document Intelligence'
+        else:
+            text_content = extract_text_from_pdf_pypdf2(pdf_path)
+            method_used = 'Alternative Method'
+
+    if text_content and content_hash:
+        get_extraction_cache().put(_pdf_extraction_cache_key(content_hash, use_azure), text_content.encode('utf-8'))
+    return text_content, method_used
+
+# Fetch layer for websites: pooled connections, an HTTP cache honoring ETag/Last-Modified and a body size limit
+WEB_CACHE_DIR = Path('cache') / 'http'
+WEB_CACHE_MAX_BYTES = int(os.getenv('WEB_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+WEB_MAX_BODY_BYTES = int(os.getenv('WEB_MAX_BODY_BYTES', 10 * 1024 * 1024))
+WEB_FETCH_TIMEOUT = float(os.getenv('WEB_FETCH_TIMEOUT', 15))
+MAX_CONCURRENT_FETCHES = int(os.getenv('MAX_CONCURRENT_FETCHES', 8))
+http_fetcher = HTTPFetcher(WEB_CACHE_DIR, WEB_CACHE_MAX_BYTES, max_body_bytes=WEB_MAX_BODY_BYTES,
+                           timeout=(5, WEB_FETCH_TIMEOUT), pool_size=MAX_CONCURRENT_FETCHES)
+HTML_PARSER = default_html_parser()
+
+def extract_text_from_html(html):
+    """Extracts the readable text of an HTML document, one paragraph-like phrase per line."""
+    with metrics.timed('website_parse', parser=HTML_PARSER):
+        # Parse HTML content
+        soup = BeautifulSoup(html, HTML_PARSER)
+
+        # Remove scripts, styles, and other non-text elements
+        for script in soup(["script", "style", "header", "footer", "nav", "aside"]):
+            script.decompose()
+
+        # Extract text
+        text = soup.get_text(separator='\n')
+
+        # Collapse multiple newlines into single ones
+        lines = [line.strip() for line in text.splitlines()]
+        chunks = [phrase for line in lines for phrase in line.split("  ") if phrase]
+        return '\n'.join(chunks)
+
 def extract_text_from_website(url):
     """
     Fetches the content of the website at the given URL and extracts meaningful text.
     """
     try:
         logging.info(f"Fetching website content from URL: {url}")
-        headers = {
-            "User-Agent": "Mozilla/5.0 (compatible; PodcastGenerator/1.0; +http://yourdomain.com/bot)"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raises HTTPError for bad responses
+        with metrics.timed('website_fetch'):
+            page = http_fetcher.fetch(url)
+        metrics.incr('website_fetches', source='cache' if page.from_cache else 'network')
 
         # Check if the content type is HTML
-        content_type = response.headers.get('Content-Type', '')
-        if 'text/html' not in content_type:
-            logging.error(f"URL does not point to an HTML page. Content-Type: {content_type}")
+        if 'text/html' not in page.content_type:
+            logging.error(f"URL does not point to an HTML page. Content-Type: {page.content_type}")
             return None
 
     except requests.RequestException as e:
         logging.error(f"Error fetching website content: {e}")
         return None
 
-    # Parse HTML content
-    soup = BeautifulSoup(response.text, 'html.parser')
+    clean_text = extract_text_from_html(page.text)
 
-    # Remove scripts, styles, and other non-text elements
-    for script in soup(["script", "style", "header", "footer", "nav", "aside"]):
-        script.decompose()
+    logging.info("Text extraction from website successful.")
+    return clean_text
+
+def extract_text_from_websites(urls, max_workers=MAX_CONCURRENT_FETCHES):
+    """
+    Fetches and extracts several websites concurrently and combines them into one source document,
+    in the order the URLs were given. Returns (text, failed_urls); text is None if no website could be extracted.
+    """
+    urls = list(dict.fromkeys(url.strip() for url in urls if url.strip()))
+    if not urls:
+        return None, []
 
-    # Extract text
-    text = soup.get_text(separator='\n')
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        texts = list(executor.map(extract_text_from_website, urls))
 
-    # Collapse multiple newlines into single ones
-    lines = [line.strip() for line in text.splitlines()]
-    chunks = [phrase for line in lines for phrase in line.split("  ") if phrase]
-    clean_text = '\n'.join(chunks)
+    failed_urls = [url for url, text in zip(urls, texts) if not text]
+    sections = [text for text in texts if text]
+    if failed_urls:
+        logging.warning(f"Failed to extract {len(failed_urls)} of {len(urls)} websites: {failed_urls}")
+    return ('\n\n'.join(sections) if sections else None), failed_urls
 
-    logging.info("Text extraction from website successful.")
-    return clean_text
+
+# Batch ingestion: sources accepted per batch and extracted at a time
+MAX_BATCH_SOURCES = int(os.getenv('MAX_BATCH_SOURCES', 25))
+MAX_CONCURRENT_INGESTS = int(os.getenv('MAX_CONCURRENT_INGESTS', 4))
+# Shorter sentences (headings, captions, page numbers) are kept even when repeated
+MIN_DEDUP_SENTENCE_CHARS = 40
+# Splits a paragraph into sentences, keeping the end punctuation and closing quotes with each sentence
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|(?<=[.!?]["\')\]])\s+')
+
+def extract_source(source):
+    """
+    Extracts the text of one batch source, a dict with 'type' 'pdf' (and 'path', 'use_azure', 'content_hash')
+    or 'url' (and 'url'). Returns (text, method_used); text is None if extraction failed.
+    """
+    if source['type'] == 'pdf':
+        cached_text = get_cached_pdf_text(source['content_hash'], source['use_azure'])
+        if cached_text:
+            return cached_text, 'cached text'
+        return extract_pdf_text(source['path'], source['use_azure'], source['content_hash'])
+    return extract_text_from_website(source['url']), 'website'
+
+def iter_extracted_sources(sources, max_workers=MAX_CONCURRENT_INGESTS):
+    """
+    Extracts the sources concurrently and yields (index, text, method_used) for each one as soon as it is done.
+    Sources that fail are yielded with text None.
+    """
+    if not sources:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources))))
+    try:
+        futures = {executor.submit(extract_source, source): i for i, source in enumerate(sources)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                text, method_used = future.result()
+            except Exception as e:
+                print(f"Error extracting source {i + 1}: {e}")
+                text, method_used = None, None
+            yield i, text, method_used
+    finally:
+        # Drop sources that have not started if the consumer stopped early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _sentence_fingerprint(sentence):
+    # Case, punctuation and spacing differences between extractors do not make a sentence new
+    normalized = ' '.join(re.sub(r'[^\w\s]', ' ', sentence.lower()).split())
+    return hashlib.sha1(normalized.encode('utf-8')).digest()
+
+def combine_source_texts(texts):
+    """
+    Combines source texts into one corpus, one section per source, dropping sentences that already appeared
+    earlier in the corpus. Paragraphs are separated by blank lines; the lines inside a paragraph are joined,
+    since extractors wrap them differently (PyPDF2 returns visual lines). Returns (text, duplicates_removed).
+    """
+    seen = set()
+    sections = []
+    duplicates_removed = 0
+    for text in texts:
+        kept_paragraphs = []
+        for paragraph in re.split(r'\n\s*\n', text):
+            kept = []
+            for sentence in SENTENCE_SPLIT.split(' '.join(paragraph.split())):
+                if not sentence:
+                    continue
+                if len(sentence) >= MIN_DEDUP_SENTENCE_CHARS:
+                    fingerprint = _sentence_fingerprint(sentence)
+                    if fingerprint in seen:
+                        duplicates_removed += 1
+                        continue
+                    seen.add(fingerprint)
+                kept.append(sentence)
+            if kept:
+                kept_paragraphs.append(' '.join(kept))
+        if kept_paragraphs:
+            sections.append('\n\n'.join(kept_paragraphs))
+    return '\n\n'.join(sections), duplicates_removed
 
 
 def transcribe_audio(audio_path):
@@ -207,7 +563,8 @@ def transcribe_audio(audio_path):
             }), 'application/json')
         }
 
-        response = requests.post(api_url, headers=headers, files=files)
+        with metrics.timed('transcription'):
+            response = requests.post(api_url, headers=headers, files=files)
 
         if response.status_code != 200:
             print(f"Transcription API error: {response.text}")
@@ -229,11 +586,8 @@ def transcribe_audio(audio_path):
         return None
 
 
-def generate_answer(question, context):
-    """
-    Generates a brief answer to the question based on the provided context using GPT-4.
-    """
-    prompt = f"""
+def build_answer_prompt(question, context):
+    return f"""
     Answer the following question based on the provided context.
     If the answer is not present in the context, please just state this.
 
@@ -246,14 +600,21 @@ def generate_answer(question, context):
     Answer:
     """
 
+def generate_answer(question, context):
+    """
+    Generates a brief answer to the question based on the provided context using GPT-4.
+    """
+    prompt = build_answer_prompt(question, context)
+
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        with metrics.timed('llm_request', purpose='answer'):
+            response = create_chat_completion(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         answer = response.choices[0].message.content.strip()
         print("Answer generated by OpenAI.")
         return answer
@@ -261,32 +622,85 @@ def generate_answer(question, context):
         print(f"OpenAI API error: {e}")
         return None
 
-def synthesize_speech(conversation, process_id, speaker1_voice, speaker2_voice):
-    if not speech_config:
-        print("Speech configuration is not set up properly.")
-        return None
-
-    # Define voices for speakers based on user selection
-    voices = {
-        'Speaker1': speaker1_voice,
-        'Speaker2': speaker2_voice
-    }
-
-    # Split conversation into lines
-    lines = conversation.strip().split('\n')
-
-    # Create a single speech synthesizer instance
-    synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-
-    # Prepare directories for audio segments within static/audio
-    audio_segments_dir = Path('static') / 'audio' / f"audio_segments_{process_id}"
+def generate_answer_stream(question, context):
+    """
+    Generates an answer like generate_answer, but streams the completion.
+    Yields text deltas as they arrive.
+    """
+    prompt = build_answer_prompt(question, context)
+    start = time.perf_counter()
+    first_delta = True
     try:
-        audio_segments_dir.mkdir(parents=True, exist_ok=True)
-        print(f"Audio segments directory created at {audio_segments_dir}")
+        response = create_chat_completion(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            stream=True
+        )
+        for delta in iter_stream_deltas(response):
+            if first_delta:
+                metrics.observe('llm_first_token', time.perf_counter() - start, purpose='answer_stream')
+                first_delta = False
+            yield delta
+        metrics.observe('llm_request', time.perf_counter() - start, purpose='answer_stream')
+        print("Answer streamed by OpenAI.")
     except Exception as e:
-        print(f"Error creating audio segments directory {audio_segments_dir}: {e}")
-        return None
+        print(f"OpenAI API error: {e}")
+
+# Upper bound on concurrent synthesis requests across all worker processes
+MAX_CONCURRENT_REQUESTS = 5  # Adjust based on your Azure subscription limits
 
+@lazy_client
+def get_tts_limiter():
+    """Returns the limiter shared by all speech synthesis requests."""
+    return AdaptiveLimiter('tts', _rate_limit_db(), max_concurrency=MAX_CONCURRENT_REQUESTS)
+
+# Character budget for packing consecutive turns into one SSML request when rendering a whole episode.
+# Streams synthesize turn by turn so the first audio is not delayed.
+TTS_BATCH_MAX_CHARS = int(os.getenv('TTS_BATCH_MAX_CHARS', 2000))
+
+# Encoding of rendered podcasts ('mp3', 'opus' or 'wav'). Speech is always synthesized as PCM so lines can be
+# cached, split and joined losslessly, and is encoded once while the episode is assembled.
+AUDIO_OUTPUT_FORMAT = os.getenv('AUDIO_OUTPUT_FORMAT', 'mp3')
+
+# Settings that shape the synthesized audio besides voice and text; part of every TTS cache key.
+# The audio format is the backend's own output_format, which it applies to the service.
+SSML_SETTINGS = {
+    'xml_lang': 'en-US',
+}
+
+# Persistent cache of synthesized lines, shared across episodes and processes
+TTS_CACHE_DIR = Path('cache') / 'tts'
+
+@lazy_client
+def get_tts_cache():
+    """Returns the cache of synthesized lines, limited to TTS_CACHE_MAX_BYTES (read on first use)."""
+    return DiskCache(TTS_CACHE_DIR, int(os.getenv('TTS_CACHE_MAX_BYTES', 1024 * 1024 * 1024)), suffix='.wav')
+
+def tts_cache_key(voice, text):
+    """Builds the TTS cache key for a line from its voice, whitespace-normalized text, SSML settings and backend."""
+    backend = get_tts_backend()
+    return DiskCache.make_key('tts', backend.name, backend.output_format, voice, ' '.join(text.split()), SSML_SETTINGS)
+
+def build_ssml(voice, text):
+    """Wraps a single line of dialogue in an SSML document for the given voice."""
+    return f"""
+    <speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='{SSML_SETTINGS['xml_lang']}'>
+        <voice name='{voice}'>
+            <p>
+                {text}
+            </p>
+        </voice>
+    </speak>
+    """
+
+def parse_conversation_lines(lines, voices):
+    """
+    Turns an iterable of script lines into speakable lines.
+    Yields (line_number, voice, text) tuples in script order, skipping blank lines and annotations.
+    """
     for i, line in enumerate(lines, start=1):
         if not line.strip():
             continue
@@ -295,14 +709,6 @@ def synthesize_speech(conversation, process_id, speaker1_voice, speaker2_voice):
         if re.match(r'^\*\*\[.*\]\*\*$', line.strip()):
             continue
 
-        # Define the path for each audio segment
-        audio_filename = f"ssml_output_{i}.wav"
-        audio_filename_path = audio_segments_dir / audio_filename
-
-        if audio_filename_path.exists():
-            print(f"Audio segment {audio_filename_path} already exists. Skipping synthesis.")
-            continue
-
         # Match lines with format "**SpeakerName:** dialogue"
         match = re.match(r'^\*+(\w+):\*+\s*(.*)', line)
         if not match:
@@ -312,213 +718,593 @@ def synthesize_speech(conversation, process_id, speaker1_voice, speaker2_voice):
             speaker = match.group(1)
             text = match.group(2)
             voice = voices.get(speaker, 'en-US-OnyxMultilingualNeuralHD')
+            yield i, voice, text
 
-            ssml = f"""
-            <speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='en-US'>
-                <voice name='{voice}'>
-                    <p>
-                        {text}
-                    </p>
-                </voice>
-            </speak>
-            """
-            print(f"Synthesizing line {i}: {ssml.strip()}")
+def parse_conversation(conversation, voices):
+    """
+    Splits a conversation into speakable lines.
+    Returns a list of (line_number, voice, text) tuples in script order.
+    """
+    return list(parse_conversation_lines(conversation.strip().split('\n'), voices))
 
-            try:
-                result = synthesizer.speak_ssml_async(ssml).get()
-            except Exception as e:
-                print(f"Speech synthesis error for line {i}: {e}")
-                return None
+def _speak_ssml_with_retry(backend, ssml, label, max_retries=5, initial_backoff=1):
+    """
+    Synthesizes an SSML document within the shared TTS rate limit and returns the SynthesisResult, or None on failure.
+    Throttling errors (error code 4429) and exceptions give up their slot and are retried after a jittered
+    exponential backoff starting at initial_backoff seconds; throttling also lowers the shared concurrency limit.
+    """
+    for attempt in range(max_retries + 1):
+        logger.debug(f"Synthesizing {label} (Attempt {attempt + 1})")
 
-            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                try:
-                    with audio_filename_path.open("wb") as audio_file:
-                        audio_file.write(result.audio_data)
-                    print(f"Speech synthesized and saved to {audio_filename_path}")
-                except Exception as e:
-                    print(f"Error saving audio segment {audio_filename_path}: {e}")
-                    return None
-            elif result.reason == speechsdk.ResultReason.Canceled:
-                cancellation_details = result.cancellation_details
-                print(f"Speech synthesis canceled: {cancellation_details.reason}")
-                if cancellation_details.reason == speechsdk.CancellationReason.Error and cancellation_details.error_details:
-                    print(f"Error details: {cancellation_details.error_details}")
+        try:
+            with get_tts_limiter().slot() as slot:
+                with metrics.timed('tts_request', backend=backend.name):
+                    result = backend.synthesize(ssml)
+                if result.audio_data is None:
+                    slot.outcome = 'throttled' if result.throttled else 'error'
+
+            if result.audio_data is not None:
+                metrics.incr('tts_requests', outcome='success')
+                logger.debug(f"Synthesized {label} successfully.")
+                return result
+
+            logger.warning(f"Speech synthesis canceled for {label}. Error details: {result.error}")
+            if not result.throttled:
+                # Other errors, do not retry
+                metrics.incr('tts_requests', outcome='error')
+                print(f"Non-throttling error encountered. Skipping {label}.")
                 return None
+            metrics.incr('tts_requests', outcome='throttled')
+            reason = 'throttled'
 
-    # Combine the audio segments
-    combined_audio = AudioSegment.silent(duration=0)
-    try:
-        audio_files = sorted(
-            [f for f in audio_segments_dir.iterdir() if f.suffix == '.wav'],
-            key=lambda x: int(re.findall(r'\d+', x.name)[0])
-        )
-    except Exception as e:
-        print(f"Error listing audio segments in {audio_segments_dir}: {e}")
+        except Exception as e:
+            metrics.incr('tts_requests', outcome='exception')
+            logger.warning(f"Exception during speech synthesis for {label}: {e}")
+            reason = 'exception'
+
+        if attempt == max_retries:
+            print(f"Exceeded maximum retries for {label}. Skipping.")
+            return None
+        metrics.incr('tts_retries', reason=reason)
+        # The slot has been released, so other requests can proceed while this one waits
+        backoff_time = backoff_delay(attempt, initial_backoff)
+        logger.warning(f"Retrying {label} in {backoff_time:.1f} seconds ({reason})...")
+        time.sleep(backoff_time)
+    return None
+
+def _synthesize_line(ssml, label, cache_key=None):
+    """
+    Synthesizes one line on the calling worker thread within the shared concurrency budget.
+    The result is stored in the TTS cache under cache_key, if given.
+    """
+    result = _speak_ssml_with_retry(get_tts_backend(), ssml, label)
+    if result is None:
         return None
+    if cache_key:
+        get_tts_cache().put(cache_key, result.audio_data)
+    return result.audio_data
 
-    for audio_file_path in audio_files:
+def build_batch_ssml(turns):
+    """
+    Packs several (voice, text) turns into one multi-voice SSML document.
+    Each turn starts with a bookmark so its offset in the synthesized audio can be recovered.
+    """
+    voices = ''.join(
+        f"""
+        <voice name='{voice}'>
+            <bookmark mark='turn_{k}'/>
+            <p>
+                {text}
+            </p>
+        </voice>"""
+        for k, (voice, text) in enumerate(turns)
+    )
+    return f"""
+    <speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='{SSML_SETTINGS['xml_lang']}'>{voices}
+    </speak>
+    """
+
+def _synthesize_batch(turns, label, cache_keys):
+    """
+    Synthesizes consecutive (voice, text) turns in a single request and splits the audio at the
+    turn bookmarks. Returns one WAV payload per turn, each cached like a single line.
+    Falls back to one request per turn if the batch cannot be split.
+    """
+    result = _speak_ssml_with_retry(get_tts_backend(), build_batch_ssml(turns), label)
+
+    try:
+        if result is None:
+            raise RuntimeError("batch synthesis failed")
+        offsets = [result.bookmarks[f"turn_{k}"] for k in range(len(turns))]
+        params, pcm = split_wav(result.audio_data)
+        turn_pcm = split_pcm_at_offsets(params, pcm, offsets)
+    except Exception as e:
+        print(f"Could not split {label} into turns ({e}). Synthesizing its turns one by one.")
+        return [
+            _synthesize_line(build_ssml(voice, text), f"{label} turn {k + 1}", cache_key)
+            for k, ((voice, text), cache_key) in enumerate(zip(turns, cache_keys))
+        ]
+
+    results = []
+    for turn_audio, cache_key in zip(turn_pcm, cache_keys):
+        turn_wav = build_wav(params, turn_audio)
+        if cache_key:
+            get_tts_cache().put(cache_key, turn_wav)
+        results.append(turn_wav)
+    return results
+
+def iter_synthesized_lines(lines, concurrency=MAX_CONCURRENT_REQUESTS, use_cache=True, batch_chars=0):
+    """
+    Synthesizes (line_number, voice, text) tuples on a pool of `concurrency` workers.
+    Yields (line_number, audio_data) in script order as soon as each line and its predecessors are done.
+    `lines` may be a lazy iterable (e.g. a streamed script); lines are dispatched as they arrive.
+    Lines found in the TTS cache are not synthesized again; new results are added to it.
+    With batch_chars, consecutive uncached lines are packed into multi-voice requests of up to that many characters
+    and the backend's max_voice_elements turns;
+    for a list of lines, a batch is also capped at its share of the script (total characters / concurrency).
+    A line is never held back to wait for the next one, so batching does not delay the audio of a lazy iterable.
+    Raises RuntimeError if a line cannot be synthesized.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    submitted = queue.Queue()
+    stopped = threading.Event()
+
+    def submit_batch(batch):
+        if len(batch) == 1:
+            i, voice, text, cache_key = batch[0]
+            submitted.put((i, executor.submit(_synthesize_line, build_ssml(voice, text), f"line {i}", cache_key)))
+            return
+
+        line_futures = [Future() for _ in batch]
+
+        def resolve_lines(batch_future):
+            for k, line_future in enumerate(line_futures):
+                if batch_future.cancelled():
+                    line_future.cancel()
+                elif batch_future.exception() is not None:
+                    line_future.set_exception(batch_future.exception())
+                else:
+                    line_future.set_result(batch_future.result()[k])
+
+        batch_future = executor.submit(
+            _synthesize_batch,
+            [(voice, text) for _, voice, text, _ in batch],
+            f"lines {batch[0][0]}-{batch[-1][0]}",
+            [cache_key for _, _, _, cache_key in batch]
+        )
+        batch_future.add_done_callback(resolve_lines)
+        for (i, _, _, _), line_future in zip(batch, line_futures):
+            submitted.put((i, line_future))
+
+    max_batch_chars = batch_chars
+    if batch_chars and isinstance(lines, (list, tuple)):
+        # Batches never take more than their share of the script, so short episodes still keep
+        # `concurrency` requests in flight instead of collapsing into one or two large requests
+        total_chars = sum(len(text) for _, _, text in lines)
+        max_batch_chars = min(batch_chars, math.ceil(total_chars / max(1, concurrency)))
+    # Each turn is a <voice> element, and the service limits how many one SSML document may have
+    max_batch_turns = get_tts_backend().max_voice_elements if max_batch_chars > 0 else 1
+
+    def lookahead():
+        """
+        Yields (line, more): `more` tells whether the next line is already available, so a batch is only
+        extended with lines that do not have to be waited for. Without batching, every line goes out at once.
+        """
+        if max_batch_chars <= 0:
+            for line in lines:
+                yield line, False
+            return
+        if isinstance(lines, (list, tuple)):
+            for k, line in enumerate(lines):
+                yield line, k + 1 < len(lines)
+            return
+
+        # A lazy producer (e.g. a streamed script) is read on its own thread, so the lines it has produced
+        # can be told apart from those it is still working on
+        ready = queue.Queue()
+
+        def read():
+            try:
+                for line in lines:
+                    ready.put(line)
+                    if stopped.is_set():
+                        break
+            except Exception as e:
+                ready.put(e)
+            finally:
+                ready.put(None)
+
+        threading.Thread(target=read, daemon=True).start()
+        while True:
+            item = ready.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item, not ready.empty()
+
+    def submit_lines():
+        # Runs on its own thread so a slow producer of lines never delays finished audio
+        batch = []
         try:
-            audio_segment = AudioSegment.from_file(audio_file_path, format="wav")
-            combined_audio += audio_segment
+            for (i, voice, text), more in lookahead():
+                if stopped.is_set():
+                    break
+                cache_key = tts_cache_key(voice, text) if use_cache else None
+                cached_audio = get_tts_cache().get(cache_key) if cache_key else None
+
+                if cached_audio is not None:
+                    logger.debug(f"Using cached audio for line {i}.")
+                    # Keep the script order: lines batched so far go first
+                    if batch:
+                        submit_batch(batch)
+                        batch = []
+                    future = Future()
+                    future.set_result(cached_audio)
+                    submitted.put((i, future))
+                    continue
+
+                if batch and (len(batch) >= max_batch_turns
+                              or sum(len(line[2]) for line in batch) + len(text) > max_batch_chars):
+                    submit_batch(batch)
+                    batch = []
+                batch.append((i, voice, text, cache_key))
+                if not more:
+                    # Never hold a line back waiting for the next one
+                    submit_batch(batch)
+                    batch = []
+            if batch and not stopped.is_set():
+                submit_batch(batch)
         except Exception as e:
-            print(f"Error loading audio segment {audio_file_path.name}: {e}")
-            continue
+            submitted.put(e)
+        finally:
+            submitted.put(None)
+
+    threading.Thread(target=submit_lines, daemon=True).start()
+    try:
+        # Consume results in submission order so segments keep the script order
+        while True:
+            item = submitted.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise RuntimeError(f"Error reading conversation lines: {item}")
+            i, future = item
+            audio_data = future.result()
+            if audio_data is None:
+                raise RuntimeError(f"Speech synthesis failed for line {i}")
+            yield i, audio_data
+    finally:
+        # Drop queued lines if the consumer failed or stopped early (e.g. a client disconnected)
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def synthesize_speech(conversation, process_id, speaker1_voice, speaker2_voice, concurrency=MAX_CONCURRENT_REQUESTS, use_cache=True, progress_callback=None, batch_chars=None, output_format=None):
+    """
+    Synthesizes every line of the conversation and combines them into a single podcast file.
+    Lines are dispatched to a pool of `concurrency` workers and their PCM data is appended to
+    the output file in script order as soon as it is available, encoded in output_format
+    (see OUTPUT_FORMATS; falls back to WAV if the encoder is not available).
+    Unchanged lines are served from the TTS cache, so re-rendering an edited script only synthesizes edited lines.
+    If given, progress_callback(done, total) is called after each line is added to the output.
+    Consecutive turns are synthesized in multi-voice requests of up to batch_chars characters (0 disables batching).
+    batch_chars and output_format default to the TTS_BATCH_MAX_CHARS and AUDIO_OUTPUT_FORMAT settings at call time.
+    """
+    if batch_chars is None:
+        batch_chars = TTS_BATCH_MAX_CHARS
+    if output_format is None:
+        output_format = AUDIO_OUTPUT_FORMAT
+    if not get_tts_backend():
+        print("Speech configuration is not set up properly.")
+        return None
+
+    # Define voices for speakers based on user selection
+    voices = {
+        'Speaker1': speaker1_voice,
+        'Speaker2': speaker2_voice
+    }
 
     # Generate timestamp for the final audio file
     timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    audio_filename = f"podcast_{timestamp}_{process_id}.wav"
+    output_format = resolve_output_format(output_format)
+    audio_filename = f"podcast_{timestamp}_{process_id}.{OUTPUT_FORMATS[output_format]['extension']}"
     output_file_path = Path('static') / audio_filename
 
+    writer = open_audio_writer(output_file_path, output_format)
+    start = time.perf_counter()
+    get_retention().hold(output_file_path)
     try:
-        combined_audio.export(output_file_path, format='wav')
+        lines = parse_conversation(conversation, voices)
+        for done, (_, audio_data) in enumerate(iter_synthesized_lines(lines, concurrency, use_cache, batch_chars), start=1):
+            with metrics.timed('audio_assembly'):
+                writer.write(*split_wav(audio_data))
+            if progress_callback:
+                progress_callback(done, len(lines))
+
+        with metrics.timed('audio_export'):
+            writer.close()
+        metrics.observe('speech_synthesis', time.perf_counter() - start)
+        if writer.params is None:
+            raise RuntimeError("No lines were synthesized")
         print(f"Combined audio exported to {output_file_path}")
     except Exception as e:
-        print(f"Error exporting combined audio: {e}")
+        print(f"Error combining audio segments: {e}")
+        try:
+            writer.close()
+        except Exception as close_error:
+            print(f"Error closing audio writer: {close_error}")
+        cleanup_temp_file(output_file_path)
         return None
+    finally:
+        get_retention().release(output_file_path)
 
     # Convert the Path to a relative POSIX path for URL usage
     audio_file_relative = output_file_path.relative_to('static').as_posix()
     print(f"Audio file relative path: {audio_file_relative}")
 
-    cleanup_old_files()
     return audio_file_relative
 
-def split_text_into_sentences(text):
+def _iter_pcm(lines, concurrency):
+    """Yields (params, pcm) for each synthesized (line_number, voice, text) tuple, in order and in one audio format."""
+    stream_params = None
+    try:
+        for i, audio_data in iter_synthesized_lines(lines, concurrency):
+            params, pcm = split_wav(audio_data)
+            if stream_params is None:
+                stream_params = params
+            elif params != stream_params:
+                print(f"Audio format of line {i} does not match the stream format. Skipping.")
+                continue
+            yield params, pcm
+    except Exception as e:
+        print(f"Error streaming synthesized speech: {e}")
+
+def _stream_audio(lines, concurrency, output_format):
+    """Yields an audio stream in output_format for (line_number, voice, text) tuples, starting with the first line."""
+    try:
+        yield from encode_stream(_iter_pcm(lines, concurrency), output_format)
+    except Exception as e:
+        print(f"Error encoding audio stream: {e}")
+
+def synthesize_speech_stream(conversation, speaker1_voice, speaker2_voice, concurrency=MAX_CONCURRENT_REQUESTS, output_format='wav'):
     """
-    Splits text into chunks of at least 3 sentences using regular expressions.
+    Synthesizes the conversation like synthesize_speech, but yields an audio stream instead of writing a file.
+    Each line's audio is sent as soon as it is ready: raw PCM after a WAV header for 'wav', or encoded on the fly
+    for compressed formats. output_format must already be resolved with resolve_output_format().
     """
-    # # Step 1: Split the text into individual sentences
-    # sentences = re.findall(r'[^.!?]+[.!?]+', text) or [text]
+    if not get_tts_backend():
+        print("Speech configuration is not set up properly.")
+        return
 
-    # # Step 2: Group sentences into chunks of at least 3 sentences
-    # chunks = []
-    # temp_chunk = []
+    voices = {
+        'Speaker1': speaker1_voice,
+        'Speaker2': speaker2_voice
+    }
+    yield from _stream_audio(parse_conversation(conversation, voices), concurrency, output_format)
 
-    # for i, sentence in enumerate(sentences):
-    #     temp_chunk.append(sentence.strip())
-        
-    #     # If we have 3 sentences in the temp_chunk or it's the last sentence, form a chunk
-    #     if len(temp_chunk) >= 3 or i == len(sentences) - 1:
-    #         chunks.append(' '.join(temp_chunk))  # Combine the sentences into a chunk
-    #         temp_chunk = []  # Reset the temp_chunk
-    chunks = [text]
+# Scripts of streamed podcasts are generated once, in the background, and written to static/conversations line
+# by line; stream requests read them from there, so replaying a stream or serving it from another worker never
+# generates a new script
+CONVERSATIONS_DIR = Path('static') / 'conversations'
+SCRIPT_LINE_TIMEOUT = 300  # Seconds a stream waits for the next line of a script before giving up
 
-    return chunks
+def podcast_script_paths(stream_id):
+    """Returns the (finished, in progress, failed) script paths of a streamed podcast."""
+    base = CONVERSATIONS_DIR / f"conversation_{stream_id}"
+    return base.with_suffix('.txt'), base.with_suffix('.partial'), base.with_suffix('.failed')
 
-import threading
+def open_podcast_script(stream_id):
+    """Creates the in-progress script of a streamed podcast, so its stream can be requested before the first line exists."""
+    CONVERSATIONS_DIR.mkdir(parents=True, exist_ok=True)
+    podcast_script_paths(stream_id)[1].touch()
 
-# Semaphore to limit concurrent synthesis requests
-MAX_CONCURRENT_REQUESTS = 5  # Adjust based on your Azure subscription limits
-synthesizer_semaphore = threading.Semaphore(MAX_CONCURRENT_REQUESTS)
+def write_podcast_script(text_content, stream_id):
+    """
+    Generates the script of a streamed podcast opened with open_podcast_script(): long texts are condensed, then
+    each line is appended to the in-progress file as soon as OpenAI completes it. Blocks until the script is done,
+    so it runs on a background job. Returns the script, saved as conversation_<stream_id>.txt, or None on failure,
+    in which case a .failed marker ends the stream.
+    """
+    final_path, partial_path, failed_path = podcast_script_paths(stream_id)
+    try:
+        condensed_text, timings = condense_text(text_content)
+        print(f"Text condensing timings: {timings}")
+        with open(partial_path, 'a', encoding='utf-8') as f:
+            for line in generate_conversation_stream(condensed_text, stream_id):
+                f.write(line + '\n')
+                f.flush()
+    except Exception as e:
+        print(f"Error generating podcast script {stream_id}: {e}")
+
+    script = final_path.read_text(encoding='utf-8') if final_path.exists() else None
+    if script is None:
+        failed_path.touch()
+    try:
+        partial_path.unlink()
+    except OSError:
+        pass
+    return script
+
+def iter_podcast_script(stream_id, timeout=SCRIPT_LINE_TIMEOUT, poll_interval=0.1):
+    """
+    Yields the lines of a streamed podcast's script: all of them if the script is finished, otherwise each line
+    as soon as it is written. Stops at the end of the script, if its generation failed, or after `timeout`
+    seconds without a new line.
+    """
+    final_path, partial_path, failed_path = podcast_script_paths(stream_id)
+    partial = None
+    pending = ''
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            if partial is None:
+                if final_path.exists():
+                    yield from final_path.read_text(encoding='utf-8').splitlines()
+                    return
+                try:
+                    partial = open(partial_path, encoding='utf-8')
+                except FileNotFoundError:
+                    # Finished (or failed) between the two checks
+                    if failed_path.exists() or not final_path.exists():
+                        return
+                    continue
+
+            # Checked before reading, so the read below sees every line written before the script was finished
+            finished = final_path.exists() or failed_path.exists()
+            pending += partial.read()
+            *lines, pending = pending.split('\n')
+            if lines:
+                yield from lines
+                deadline = time.monotonic() + timeout
+            elif finished:
+                return
+            elif time.monotonic() > deadline:
+                print(f"Gave up waiting for the next line of podcast script {stream_id}.")
+                return
+            else:
+                time.sleep(poll_interval)
+    finally:
+        if partial is not None:
+            partial.close()
+
+def podcast_script_stream(stream_id, speaker1_voice, speaker2_voice, concurrency=MAX_CONCURRENT_REQUESTS, output_format='wav'):
+    """
+    Yields the audio of a streamed podcast started with open_podcast_script(), synthesizing each line as soon as
+    it is written. Replays only synthesize again, and the TTS cache serves the lines already synthesized.
+    """
+    if not get_tts_backend():
+        print("Speech configuration is not set up properly.")
+        return
+
+    voices = {
+        'Speaker1': speaker1_voice,
+        'Speaker2': speaker2_voice
+    }
+    script_lines = iter_podcast_script(stream_id)
+    yield from _stream_audio(parse_conversation_lines(script_lines, voices), concurrency, output_format)
+
+# End of a sentence: terminal punctuation (and closing quotes or brackets) followed by whitespace, or a line break
+SENTENCE_BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+|\n\s*')
+
+def iter_sentences(text_chunks, min_chars=0):
+    """
+    Reassembles streamed text chunks and yields each sentence as soon as the whitespace after it arrives.
+    Sentences shorter than min_chars are joined with the following ones.
+    """
+    buffer = ''
+    for chunk in text_chunks:
+        buffer += chunk
+        while True:
+            boundary = next((match for match in SENTENCE_BOUNDARY.finditer(buffer)
+                             if len(buffer[:match.end()].strip()) >= min_chars), None)
+            if boundary is None:
+                break
+            sentence = buffer[:boundary.end()].strip()
+            buffer = buffer[boundary.end():]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+def split_text_into_sentences(text):
+    """
+    Splits text into chunks of at least 3 sentences (the last chunk may be shorter).
+    """
+    sentences = list(iter_sentences([text])) or [text]
+    return [' '.join(sentences[i:i + 3]) for i in range(0, len(sentences), 3)]
 
-def synthesize_text_stream(text, process_id, voice_name, max_retries=3, initial_backoff=5):
+def synthesize_text_stream(text, process_id, voice_name, max_retries=5, initial_backoff=1):
     """
     Splits the text into sentences and synthesizes each sentence.
     Yields each synthesized audio fragment as bytes for streaming.
     Implements a retry mechanism to handle throttling errors.
     """
-    if not speech_config:
+    if not get_tts_backend():
         print("Speech configuration is not set up properly.")
         return
 
-    # Acquire semaphore before proceeding
-    with synthesizer_semaphore:
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-
-        # Split text into sentences
-        sentences = split_text_into_sentences(text)
-
-        for i, sentence in enumerate(sentences, start=1):
-            retries = 0
-            while retries <= max_retries:
-                ssml = f"""
-                <speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='en-US'>
-                    <voice name='{voice_name}'>
-                        <p>{sentence}</p>
-                    </voice>
-                </speak>
-                """
-                print(f"Synthesizing sentence {i} (Attempt {retries + 1}): {sentence.strip()}")
-
-                try:
-                    result = synthesizer.speak_ssml_async(ssml).get()
-
-                    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                        yield result.audio_data
-                        print(f"Synthesized sentence {i} successfully.")
-                        break  # Exit retry loop for this sentence
-
-                    elif result.reason == speechsdk.ResultReason.Canceled:
-                        cancellation_details = result.cancellation_details
-                        print(f"Speech synthesis canceled: {cancellation_details.reason}")
-                        if cancellation_details.reason == speechsdk.CancellationReason.Error and cancellation_details.error_details:
-                            error_details = cancellation_details.error_details
-                            print(f"Error details: {error_details}")
-                            if "Error code: 4429" in error_details:
-                                # Throttling error, implement retry
-                                retries += 1
-                                if retries > max_retries:
-                                    print(f"Exceeded maximum retries for sentence {i}. Skipping.")
-                                    break
-                                backoff_time = initial_backoff * retries  # Exponential backoff
-                                print(f"Throttling detected. Retrying in {backoff_time} seconds...")
-                                time.sleep(backoff_time)
-                                continue
-                            else:
-                                # Other errors, do not retry
-                                print(f"Non-throttling error encountered. Skipping sentence {i}.")
-                                break
-                        else:
-                            # Other cancellation reasons
-                            print(f"Cancellation reason: {cancellation_details.reason}. Skipping sentence {i}.")
-                            break
-
-                except Exception as e:
-                    print(f"Exception during speech synthesis for sentence {i}: {e}")
-                    retries += 1
-                    if retries > max_retries:
-                        print(f"Exceeded maximum retries for sentence {i} due to exception. Skipping.")
-                        break
-                    backoff_time = initial_backoff * retries
-                    print(f"Exception encountered. Retrying in {backoff_time} seconds...")
-                    time.sleep(backoff_time)
-                    continue
-                
-def save_text_to_file(text, file_path):
-    """Utility function to save text to a file."""
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(text)
-        print(f"Text successfully saved to {file_path}")
-    except Exception as e:
-        print(f"Error saving text to {file_path}: {e}")
+    # Split text into sentences
+    sentences = split_text_into_sentences(text)
+
+    for i, sentence in enumerate(sentences, start=1):
+        ssml = f"""
+        <speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='en-US'>
+            <voice name='{voice_name}'>
+                <p>{sentence}</p>
+            </voice>
+        </speak>
+        """
+        # Each request takes a slot of the shared TTS rate limit
+        result = _speak_ssml_with_retry(get_tts_backend(), ssml, f"sentence {i}", max_retries, initial_backoff)
+        if result:
+            yield result.audio_data
+
+# Streamed answers are synthesized sentence by sentence; shorter fragments are joined with the next sentence
+ANSWER_MIN_SENTENCE_CHARS = 40
+
+def answer_question_stream(question, context, voice_name, concurrency=MAX_CONCURRENT_REQUESTS, output_format='wav'):
+    """
+    Answers a question as a stream of speech. The answer is streamed from OpenAI, cut into sentences,
+    and each sentence is synthesized as soon as it is complete while later sentences are still being written.
+    Yields an audio stream in output_format, as synthesize_speech_stream does.
+    """
+    if not get_tts_backend():
+        print("Speech configuration is not set up properly.")
+        return
 
-def load_text_from_file(file_path):
-    """Utility function to load text from a file."""
-    try:
-        if file_path.exists():
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-            print(f"Text successfully loaded from {file_path}")
-            return text
-        else:
-            print(f"File {file_path} does not exist. Returning empty string.")
-            return ''
-    except Exception as e:
-        print(f"Error loading text from {file_path}: {e}")
-        return ''
+    sentences = iter_sentences(generate_answer_stream(question, context), ANSWER_MIN_SENTENCE_CHARS)
+    lines = ((i, voice_name, sentence) for i, sentence in enumerate(sentences, start=1))
+    start = time.perf_counter()
+    first_audio = True
+    for data in _stream_audio(lines, concurrency, output_format):
+        if first_audio:
+            metrics.observe('answer_first_audio', time.perf_counter() - start)
+            first_audio = False
+        yield data
+
+def encode_audio(wav_fragments, output_format):
+    """Joins WAV fragments, such as those from synthesize_text_stream, into one payload in output_format."""
+    chunks = [split_wav(fragment) for fragment in wav_fragments]
+    if not chunks:
+        return b''
+    if OUTPUT_FORMATS[output_format]['ffmpeg_args'] is None:
+        # A complete payload gets a WAV header with the real sizes
+        return build_wav(chunks[0][0], b''.join(pcm for _, pcm in chunks))
+    return b''.join(encode_stream(chunks, output_format))
+
+# Retention of generated files. Ages are in hours, sizes in bytes; each class is trimmed least recently used first.
+HOUR = 3600
+
+@lazy_client
+def get_retention():
+    """
+    Returns the retention manager of the generated files. It is created on first use, so the limits below
+    are read after the app has loaded its .env file.
+    """
+    retention = RetentionManager([
+        # Left behind by older versions and by crashed requests
+        RetentionPolicy('audio_segments', Path('static') / 'audio', 'audio_segments_*', max_age=HOUR),
+        RetentionPolicy('temp_audio', Path('.'), 'temp_audio_*.wav', max_age=HOUR),
+        # Uploaded PDFs are only needed until their text is extracted (and cached); queued jobs are covered by min_age
+        RetentionPolicy('uploads', Path('uploads'), '*.pdf',
+                        max_age=float(os.getenv('UPLOAD_RETENTION_HOURS', 24)) * HOUR,
+                        max_bytes=int(os.getenv('UPLOADS_MAX_BYTES', 1024 * 1024 * 1024)), min_age=HOUR),
+        RetentionPolicy('conversations', Path('static') / 'conversations', 'conversation_*',
+                        max_age=float(os.getenv('CONVERSATION_RETENTION_HOURS', 7 * 24)) * HOUR),
+        RetentionPolicy('podcasts', Path('static'), 'podcast_*',
+                        max_age=float(os.getenv('PODCAST_RETENTION_HOURS', 7 * 24)) * HOUR,
+                        max_bytes=int(os.getenv('PODCASTS_MAX_BYTES', 5 * 1024 * 1024 * 1024)), min_age=HOUR),
+    ])
+    metrics.register_collector(retention.collect_metrics)
+    return retention
+
+def cleanup_old_files(max_age=None):
+    """
+    Removes generated files according to the retention policies: uploads, conversations, podcasts and temporary audio.
+    max_age (a timedelta) overrides the age limit of every class. Returns the sweep report per class.
+    """
+    return get_retention().sweep(max_age.total_seconds() if max_age is not None else None)
 
-def cleanup_old_files():
-    """Cleans up old files."""
-    audio_segments_parent = Path('static') / 'audio'
-    for dir in audio_segments_parent.glob('audio_segments_*'):
-        #if dir.is_dir() and datetime.fromtimestamp(dir.stat().st_mtime) < threshold:
-            try:
-                shutil.rmtree(dir)
-                logging.info(f"Deleted old audio segments directory: {dir}")
-            except Exception as e:
-                logging.error(f"Error deleting directory {dir}: {e}")
-                
 def cleanup_temp_file(file_path):
     """Removes the temporary audio file."""
     try:
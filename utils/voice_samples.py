@@ -0,0 +1,78 @@
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from werkzeug.utils import secure_filename
+
+
+class VoiceSampleCache:
+    """
+    Pre-rendered voice samples on disk, one WAV file per voice.
+    `synthesize(voice_name, text)` returns the sample audio, or None on failure.
+    Concurrent requests for a voice that is not on disk yet share a single synthesis, and samples are
+    written to a temporary file and renamed into place, so readers never see a partial file.
+    """
+
+    def __init__(self, directory, sample_text, synthesize):
+        self.directory = Path(directory)
+        self.sample_text = sample_text
+        self.synthesize = synthesize
+        self._in_flight = {}  # voice name -> Future of the sample path
+        self._lock = threading.Lock()
+
+    def path_for(self, voice_name):
+        return self.directory / f"{secure_filename(voice_name)}_sample.wav"
+
+    def get(self, voice_name):
+        """Returns the path of the voice's sample, synthesizing it first if needed. Returns None on failure."""
+        path = self.path_for(voice_name)
+        if path.exists():
+            return path
+
+        with self._lock:
+            future = self._in_flight.get(voice_name)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[voice_name] = future
+
+        if not leader:
+            print(f"Waiting for the voice sample of {voice_name} that is already being synthesized.")
+            return future.result()
+
+        try:
+            future.set_result(self._render(voice_name, path))
+        except Exception as e:
+            print(f"Error generating voice sample for {voice_name}: {e}")
+            future.set_result(None)
+        finally:
+            with self._lock:
+                del self._in_flight[voice_name]
+        return future.result()
+
+    def _render(self, voice_name, path):
+        # Another process may have finished the sample since the caller checked
+        if path.exists():
+            return path
+
+        audio_data = self.synthesize(voice_name, self.sample_text)
+        if not audio_data:
+            return None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(audio_data)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        print(f"Voice sample for {voice_name} saved to {path}")
+        return path
+
+    def warm(self, voice_names, concurrency=4):
+        """Renders the samples of all given voices in parallel. Returns {voice_name: path or None}."""
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return dict(zip(voice_names, executor.map(self.get, voice_names)))
@@ -0,0 +1,161 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class WorkspaceStore:
+    """
+    Per-session storage for the texts a user is editing (extracted text and conversation).
+    Texts live in a SQLite database in WAL mode, so readers never block the writer and each
+    save is an atomic upsert. Autosaves are debounced: rapid successive saves of the same text
+    are coalesced in memory and written once the text has been idle for `autosave_delay` seconds.
+    """
+
+    def __init__(self, db_path, autosave_delay=2.0):
+        self.db_path = Path(db_path)
+        self.autosave_delay = autosave_delay
+        self._local = threading.local()
+        self._pending = {}  # (workspace_id, text_type) -> (text, due_time)
+        self._condition = threading.Condition()
+        self._flusher = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Orders immediate saves and autosave flushes
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS workspace_texts (
+                            workspace_id TEXT NOT NULL,
+                            text_type TEXT NOT NULL,
+                            content TEXT NOT NULL,
+                            updated_at REAL NOT NULL,
+                            PRIMARY KEY (workspace_id, text_type)
+                        )
+                    """)
+                    self._initialized = True
+            self._local.connection = connection
+        return connection
+
+    def _write(self, entries):
+        """Writes (workspace_id, text_type, text) entries in a single transaction."""
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany("""
+                INSERT INTO workspace_texts (workspace_id, text_type, content, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (workspace_id, text_type) DO UPDATE SET
+                    content = excluded.content,
+                    updated_at = excluded.updated_at
+            """, [(workspace_id, text_type, text, now) for workspace_id, text_type, text in entries])
+
+    def save(self, workspace_id, text_type, text):
+        """Saves a text immediately, replacing any pending autosave of it."""
+        with self._write_lock:
+            with self._condition:
+                self._pending.pop((workspace_id, text_type), None)
+            self._write([(workspace_id, text_type, text)])
+
+    def autosave(self, workspace_id, text_type, text):
+        """Schedules a text to be saved once it has not changed for autosave_delay seconds."""
+        with self._condition:
+            self._pending[(workspace_id, text_type)] = (text, time.monotonic() + self.autosave_delay)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='workspace-autosave', daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+            self._condition.notify()
+
+    def load(self, workspace_id, text_type):
+        """Returns the latest text, including unsaved autosaves, or '' if there is none."""
+        with self._condition:
+            pending = self._pending.get((workspace_id, text_type))
+        if pending is not None:
+            return pending[0]
+
+        row = self._connection().execute(
+            "SELECT content FROM workspace_texts WHERE workspace_id = ? AND text_type = ?",
+            (workspace_id, text_type)
+        ).fetchone()
+        return row[0] if row else ''
+
+    def expire(self, max_age):
+        """
+        Deletes the texts of workspaces that have not been saved for max_age seconds.
+        Returns a retention report: workspace texts removed and kept, with their sizes in bytes.
+        """
+        if not self.db_path.exists():
+            return {'removed_files': 0, 'reclaimed_bytes': 0, 'remaining_files': 0, 'remaining_bytes': 0}
+
+        cutoff = time.time() - max_age
+        connection = self._connection()
+        with self._write_lock:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                # A workspace expires as a whole, so its extracted text and conversation stay consistent
+                expired = """
+                    workspace_id IN (SELECT workspace_id FROM workspace_texts
+                                     GROUP BY workspace_id HAVING MAX(updated_at) < ?)
+                """
+                removed, reclaimed = connection.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM workspace_texts WHERE {expired}",
+                    (cutoff,)
+                ).fetchone()
+                connection.execute(f"DELETE FROM workspace_texts WHERE {expired}", (cutoff,))
+                remaining, remaining_bytes = connection.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM workspace_texts"
+                ).fetchone()
+        if removed:
+            logging.info(f"Removed {removed} workspace texts not saved for {max_age / 3600:.1f} h")
+        return {'removed_files': removed, 'reclaimed_bytes': reclaimed,
+                'remaining_files': remaining, 'remaining_bytes': remaining_bytes}
+
+    def _write_pending(self, keys):
+        """Writes the given pending autosaves, then drops those that did not change meanwhile."""
+        with self._write_lock:
+            with self._condition:
+                batch = {key: self._pending[key] for key in keys if key in self._pending}
+            if not batch:
+                return
+            # Pending entries stay visible to load() until they are written
+            self._write([(key[0], key[1], text) for key, (text, _) in batch.items()])
+            with self._condition:
+                for key, entry in batch.items():
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+
+    def flush(self):
+        """Writes all pending autosaves now."""
+        with self._condition:
+            keys = list(self._pending)
+        self._write_pending(keys)
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                now = time.monotonic()
+                due = [key for key, (_, due_time) in self._pending.items() if due_time <= now]
+                if not due:
+                    next_due = min(due_time for _, due_time in self._pending.values())
+                    self._condition.wait(next_due - now)
+                    continue
+
+            try:
+                self._write_pending(due)
+            except sqlite3.Error as e:
+                logging.error(f"Error autosaving {len(due)} workspace texts: {e}")
+                time.sleep(self.autosave_delay)